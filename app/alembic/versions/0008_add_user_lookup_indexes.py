@@ -0,0 +1,71 @@
+"""
+add_user_lookup_indexes
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-03-12 16:38:52.771043
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: str | None = "0007"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+INDEXES = ("ix_users_email_lower", "ix_users_role_id_is_active_id", "ix_users_inactive")
+
+
+def drop_invalid_index(name: str) -> None:
+    # An interrupted concurrent build leaves an INVALID index behind, which IF NOT EXISTS would keep.
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    )
+    if invalid.scalar():
+        op.drop_index(name, table_name="users", postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade() -> None:
+    # Built concurrently, outside the migration transaction, so writes to users are not blocked.
+    # Each index commits on its own, so the steps are idempotent and a failed upgrade can be re-run.
+    # The unique index fails if existing emails differ only by case; merge those accounts first.
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            drop_invalid_index(name)
+        op.create_index(
+            "ix_users_email_lower",
+            "users",
+            [sa.text("lower(email)")],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_users_role_id_is_active_id",
+            "users",
+            ["role_id", "is_active", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_users_inactive",
+            "users",
+            ["id"],
+            unique=False,
+            postgresql_where=sa.text("is_active IS false"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_users_inactive", table_name="users", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_users_role_id_is_active_id", table_name="users", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_users_email_lower", table_name="users", postgresql_concurrently=True, if_exists=True)
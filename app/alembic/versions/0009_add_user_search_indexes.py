@@ -0,0 +1,65 @@
+"""
+add_user_search_indexes
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-03-14 10:05:13.392817
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: str | None = "0008"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+INDEXES = ("ix_users_username_trgm", "ix_users_email_trgm")
+
+
+def drop_invalid_index(name: str) -> None:
+    # An interrupted concurrent build leaves an INVALID index behind, which IF NOT EXISTS would keep.
+    invalid = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    )
+    if invalid.scalar():
+        op.drop_index(name, table_name="users", postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Built concurrently and committed one by one, so the steps are idempotent and a failed upgrade can be re-run.
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            drop_invalid_index(name)
+        op.create_index(
+            "ix_users_username_trgm",
+            "users",
+            ["username"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={"username": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_users_email_trgm",
+            "users",
+            ["email"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={"email": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    # The extension is left installed, other objects may depend on it.
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_users_email_trgm", table_name="users", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_users_username_trgm", table_name="users", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,127 @@
+import asyncio
+import itertools
+import platform
+import subprocess
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+import httpx
+
+
+@dataclass
+class WorkloadResult:
+    name: str
+    requests: int
+    concurrency: int
+    errors: int = 0
+    duration: float = 0.0
+    latencies: list[float] = field(default_factory=list, repr=False)
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "concurrency": self.concurrency,
+            "errors": self.errors,
+            "duration_s": round(self.duration, 4),
+            "throughput_rps": round(self.requests / self.duration, 2) if self.duration else 0.0,
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        }
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    # Nearest-rank percentile, so the reported value is always one that was measured.
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+async def run_workload(
+    name: str,
+    send: Callable[[int], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+) -> WorkloadResult:
+    """
+    Sends `requests` requests through `send` from `concurrency` concurrent workers and times each one
+
+    Args:
+        name: Name of the workload in the report.
+        send: Coroutine function sending the i-th request of the workload.
+        requests: Number of measured requests.
+        concurrency: Number of requests in flight at any time.
+        warmup: Number of requests sent, but not measured, before the run.
+    """
+    result = WorkloadResult(name=name, requests=requests, concurrency=concurrency)
+    counter = itertools.count()
+
+    async def worker(total: int, record: bool) -> None:
+        while (i := next(counter)) < total:
+            start = time.perf_counter()
+            try:
+                response = await send(i)
+                failed = response.is_error
+            except httpx.HTTPError:
+                failed = True
+            if record:
+                result.latencies.append(time.perf_counter() - start)
+                result.errors += failed
+
+    if warmup:
+        await asyncio.gather(*(worker(warmup, record=False) for _ in range(concurrency)))
+        counter = itertools.count()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(requests, record=True) for _ in range(concurrency)))
+    result.duration = time.perf_counter() - start
+    return result
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    """
+    Returns the regressions of `current` against `baseline`, two reports written by a benchmark
+
+    A workload regresses when its p95 latency grows, or its throughput drops, by more than `tolerance`.
+    """
+    regressions = []
+    for name, result in current["workloads"].items():
+        previous = baseline["workloads"].get(name)
+        if previous is None:
+            continue
+        if previous["p95_ms"] and result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']}/s -> {result['throughput_rps']}/s")
+    return regressions
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'workload':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"]
+    for name, result in report["workloads"].items():
+        lines.append(
+            f"{name:<14}{result['throughput_rps']:>10}{result['p50_ms']:>10}"
+            f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['errors']:>8}"
+        )
+    return "\n".join(lines)
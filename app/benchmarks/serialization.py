@@ -0,0 +1,115 @@
+"""
+Per-row cost of serializing user responses
+
+Compares the path FastAPI takes for a response_model (validate the returned objects against
+UserResponse, serialize them, encode with JSONResponse) with the fast path used by the list
+and get-by-id endpoints (serialize_users / serialize_user encoded with ORJSONResponse).
+Rows and users come from a throwaway in-memory SQLite database, so the inputs are the same
+Row and User objects the endpoints see.
+
+    python -m app.benchmarks.serialization --output serialization.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.benchmarks.harness import environment
+from app.core.database import Base
+from app.models.roles import Role
+from app.models.users import User
+from app.schemas.users import UserResponse
+from app.utils.users import USER_RESPONSE_COLUMNS, serialize_user, serialize_users
+
+PAGE_SIZES = (1, 100, 1000)
+
+
+def load_users(count: int) -> tuple[list, User]:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as session:
+        session.add(Role(id=4, name="Viewer"))
+        session.add_all(
+            User(username=f"user{i}", email=f"user{i}@example.com", password="x", is_active=True, role_id=4)
+            for i in range(count)
+        )
+        session.commit()
+        rows = session.execute(select(*USER_RESPONSE_COLUMNS).order_by(User.id)).all()
+        user = session.get(User, 1)
+    engine.dispose()
+    return rows, user
+
+
+def timeit(func: Callable[[], object], min_time: float) -> float:
+    # Repeats func for at least min_time seconds and returns the mean time per call.
+    calls = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < min_time or calls == 0:
+        func()
+        calls += 1
+    return elapsed / calls
+
+
+def run_benchmarks(page_sizes: tuple[int, ...] = PAGE_SIZES, min_time: float = 0.5) -> dict:
+    rows, user = load_users(max(page_sizes))
+    list_field = create_model_field("Response_list", list[UserResponse])
+    user_field = create_model_field("Response_user", UserResponse)
+
+    loop = asyncio.new_event_loop()
+
+    def response_model_path(field, content) -> bytes:
+        return JSONResponse(loop.run_until_complete(serialize_response(field=field, response_content=content))).body
+
+    cases = {f"list-{size}": (size, rows[:size]) for size in page_sizes}
+    results = {}
+    for name, (size, page) in cases.items():
+        before = timeit(lambda page=page: response_model_path(list_field, page), min_time)
+        after = timeit(lambda page=page: ORJSONResponse(serialize_users(page)).body, min_time)
+        results[name] = summarize(size, before, after)
+    before = timeit(lambda: response_model_path(user_field, user), min_time)
+    after = timeit(lambda: ORJSONResponse(serialize_user(user)).body, min_time)
+    results["get"] = summarize(1, before, after)
+    loop.close()
+    return {"environment": environment(), "results": results}
+
+
+def summarize(rows: int, before: float, after: float) -> dict:
+    return {
+        "rows": rows,
+        "response_model_us": round(before * 1e6, 3),
+        "fast_path_us": round(after * 1e6, 3),
+        "response_model_per_row_us": round(before * 1e6 / rows, 3),
+        "fast_path_per_row_us": round(after * 1e6 / rows, 3),
+        "speedup": round(before / after, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=list(PAGE_SIZES))
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds spent timing each case")
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run_benchmarks(tuple(args.page_sizes), args.min_time)
+    print(f"{'case':<12}{'before us/row':>15}{'after us/row':>15}{'speedup':>10}")
+    for name, result in report["results"].items():
+        print(
+            f"{name:<12}{result['response_model_per_row_us']:>15}"
+            f"{result['fast_path_per_row_us']:>15}{result['speedup']:>10}"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Load and latency benchmark of the users API
+
+Boots app.main:app in-process through the httpx ASGI transport and drives the login, list,
+get-by-id, create and activate workloads at a fixed concurrency. The database is either a
+throwaway SQLite file (aiosqlite, the default) or the Postgres configured in the environment;
+point POSTGRES_DB at a scratch database, since --reset drops and recreates every table.
+
+Login throttling is disabled for the run, since every request comes from the same client;
+the concurrency limiters stay on, so a concurrency above their queue shows up as errors.
+The lifespan is not run, so the outbox relay never starts: registration events stay in the
+outbox table and nothing is sent to Celery.
+
+    python -m app.benchmarks.users --concurrency 16 --requests 500 --output bench.json
+    python -m app.benchmarks.users --baseline bench.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.benchmarks.harness import compare, environment, format_report, run_workload
+from app.core import database
+from app.core.admission import login_email_throttle, login_ip_throttle
+from app.core.hashing import get_password_hash, password_hasher
+from app.core.queries import instrument_engine
+from app.main import app
+from app.models.roles import Role, RolePrivilege
+from app.models.users import User
+from app.utils.roles import role_registry
+from app.utils.users import create_access_token, principal_cache, token_cache, token_versions
+
+WORKLOADS = ("login", "list", "get", "create", "activate")
+ROLES_FIXTURES = Path(__file__).resolve().parents[1] / "fixtures" / "roles.json"
+PASSWORD = "benchmark-password"
+
+
+async def seed(session_factory: sessionmaker, users: int, prefix: str) -> tuple[User, list[int]]:
+    # Every user shares one hash: hashing thousands of passwords would dominate the setup.
+    password = get_password_hash(PASSWORD, rounds=password_hasher.rounds)
+    async with session_factory() as session:
+        for role in json.loads(ROLES_FIXTURES.read_text()):
+            await session.merge(Role(id=role["id"], name=role["name"], description=role["description"]))
+        admin = User(
+            username="admin",
+            email=f"{prefix}admin@example.com",
+            password=password,
+            is_active=True,
+            role_id=RolePrivilege.ADMIN,
+        )
+        seeded = [
+            User(
+                username=f"user{i}",
+                email=f"{prefix}user{i}@example.com",
+                password=password,
+                is_active=True,
+                role_id=RolePrivilege.VIEWER,
+            )
+            for i in range(users)
+        ]
+        session.add(admin)
+        session.add_all(seeded)
+        await session.commit()
+        await role_registry.load(session)
+        return admin, [user.id for user in seeded]
+
+
+async def run_benchmarks(
+    database_backend: str = "sqlite",
+    workloads: tuple[str, ...] = WORKLOADS,
+    requests: int = 200,
+    concurrency: int = 8,
+    warmup: int = 10,
+    users: int = 1000,
+    page_size: int = 100,
+    hash_rounds: int | None = None,
+    reset: bool = False,
+    seed_value: int = 0,
+) -> dict:
+    """
+    Runs the selected workloads one after the other and returns a JSON-serializable report
+
+    Args:
+        database_backend: "sqlite" for a throwaway aiosqlite file, or "postgres" for the configured database.
+        workloads: Names of the workloads to run, in order.
+        requests: Number of measured requests per workload.
+        concurrency: Number of requests in flight at any time.
+        warmup: Number of unmeasured requests sent before each workload.
+        users: Number of users seeded before the run.
+        page_size: Limit used by the list workload.
+        hash_rounds: bcrypt rounds used for the run; defaults to the hasher's current setting.
+        reset: Drop and recreate every table of the Postgres database first.
+        seed_value: Seed of the random user ids picked by the get and activate workloads.
+    """
+    previous_rounds = password_hasher.rounds
+    throttles = (login_email_throttle, login_ip_throttle)
+    previous_enabled = [throttle.enabled for throttle in throttles]
+    for throttle in throttles:
+        throttle.enabled = False
+    if hash_rounds is not None:
+        password_hasher.rounds = hash_rounds
+
+    tmpdir = None
+    if database_backend == "sqlite":
+        tmpdir = tempfile.TemporaryDirectory()
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmpdir.name}/benchmark.db", connect_args={"timeout": 30})
+        instrument_engine(engine)
+        reset = True
+    else:
+        engine = database.engine
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_benchmark_session() -> AsyncSession:
+        async with session_factory() as session:
+            yield session
+
+    try:
+        async with engine.begin() as conn:
+            if reset:
+                await conn.run_sync(database.Base.metadata.drop_all)
+            await conn.run_sync(database.Base.metadata.create_all)
+        # A unique prefix lets runs share a database that was not reset.
+        prefix = f"bench{random.randrange(1 << 32):x}-"
+        admin, user_ids = await seed(session_factory, users, prefix)
+        for cache in (principal_cache, token_cache, token_versions):
+            cache.clear()
+
+        app.dependency_overrides[database.get_db_session] = get_benchmark_session
+        rng = random.Random(seed_value)
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark/api") as client:
+            # Warmup requests of the create workload also need unique emails.
+            created = itertools.count()
+
+            def new_user(n: int) -> dict:
+                return {"username": f"created{n}", "email": f"{prefix}created{n}@example.com", "password": PASSWORD}
+
+            auth = {"Authorization": f"Bearer {create_access_token(admin)}"}
+            senders = {
+                "login": lambda i: client.post(
+                    "/users/login",
+                    json={"email": f"{prefix}user{i % len(user_ids)}@example.com", "password": PASSWORD},
+                ),
+                "list": lambda i: client.get("/users/", params={"limit": page_size}, headers=auth),
+                "get": lambda i: client.get(f"/users/{rng.choice(user_ids)}", headers=auth),
+                "create": lambda i: client.post("/users/", json=new_user(next(created))),
+                "activate": lambda i: client.put(f"/users/activate/{rng.choice(user_ids)}", headers=auth),
+            }
+            results = {}
+            for name in workloads:
+                result = await run_workload(name, senders[name], requests, concurrency, warmup=warmup)
+                results[name] = result.summary()
+    finally:
+        app.dependency_overrides.pop(database.get_db_session, None)
+        password_hasher.rounds = previous_rounds
+        for throttle, enabled in zip(throttles, previous_enabled, strict=True):
+            throttle.enabled = enabled
+        if tmpdir is not None:
+            await engine.dispose()
+            tmpdir.cleanup()
+
+    return {
+        "environment": environment(),
+        "settings": {
+            "database": database_backend,
+            "requests": requests,
+            "concurrency": concurrency,
+            "warmup": warmup,
+            "users": users,
+            "page_size": page_size,
+            "hash_rounds": hash_rounds or previous_rounds,
+        },
+        "workloads": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per workload")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--users", type=int, default=1000, help="Users seeded before the run")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--hash-rounds", type=int, default=None)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate the Postgres tables first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the JSON report to this file")
+    parser.add_argument("--baseline", type=Path, help="Compare against a previous JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_benchmarks(
+            database_backend=args.database,
+            workloads=tuple(args.workloads),
+            requests=args.requests,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+            users=args.users,
+            page_size=args.page_size,
+            hash_rounds=args.hash_rounds,
+            reset=args.reset,
+            seed_value=args.seed,
+        )
+    )
+    print(format_report(report))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.baseline:
+        regressions = compare(json.loads(args.baseline.read_text()), report, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+
+from pydantic_settings import BaseSettings
+
+from app.core.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, REQUESTS_SHED
+from app.utils.exceptions import ServiceUnavailableException, TooManyRequestsException
+
+
+class AdmissionSettings(BaseSettings):
+    ADMISSION_LOGIN_CONCURRENCY: int = 4
+    ADMISSION_LOGIN_QUEUE: int = 32
+    ADMISSION_REGISTRATION_CONCURRENCY: int = 4
+    ADMISSION_REGISTRATION_QUEUE: int = 16
+    # Longest time a request waits in the queue before it is shed.
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0
+    ADMISSION_RETRY_AFTER: int = 1
+    LOGIN_THROTTLE_ENABLED: bool = True
+    LOGIN_THROTTLE_EMAIL_RATE: float = 0.1
+    LOGIN_THROTTLE_EMAIL_BURST: int = 5
+    # Keyed by the client address uvicorn reports, which behind a load balancer is only the real client
+    # when the balancer is listed in FORWARDED_ALLOW_IPS (see entrypoint.sh); otherwise all logins share one bucket.
+    LOGIN_THROTTLE_IP_RATE: float = 1.0
+    LOGIN_THROTTLE_IP_BURST: int = 30
+    LOGIN_THROTTLE_MAX_KEYS: int = 100_000
+
+
+class ConcurrencyLimiter:
+    """
+    Admits at most `limit` requests at a time and queues at most `max_queue` more
+
+    A request arriving when the queue is full, or waiting longer than `timeout`, is shed
+    right away with a 503 and a Retry-After header instead of piling up on the event loop.
+    Used as an async context manager around the expensive part of an endpoint.
+
+    Args:
+        name: Label of the limiter in the exported metrics.
+        limit: Number of requests admitted concurrently.
+        max_queue: Number of requests allowed to wait for a slot.
+        timeout: Seconds a request may wait for a slot.
+        retry_after: Value of the Retry-After header of shed requests.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float, retry_after: int = 1):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+        self._in_flight_gauge = ADMISSION_IN_FLIGHT.labels(name)
+        self._queue_gauge = ADMISSION_QUEUE_DEPTH.labels(name)
+
+    def _shed(self, reason: str) -> ServiceUnavailableException:
+        REQUESTS_SHED.labels(self.name, reason).inc()
+        return ServiceUnavailableException(
+            detail="Server is busy, please retry later", headers={"Retry-After": str(self.retry_after)}
+        )
+
+    async def __aenter__(self) -> None:
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise self._shed("queue_full")
+            self.waiting += 1
+            self._queue_gauge.inc()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout)
+            except TimeoutError:
+                raise self._shed("queue_timeout") from None
+            finally:
+                self.waiting -= 1
+                self._queue_gauge.dec()
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        self._in_flight_gauge.inc()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.in_flight -= 1
+        self._in_flight_gauge.dec()
+        self._semaphore.release()
+
+
+class TokenBucket:
+    """
+    Per-key token buckets, each refilled at `rate` tokens per second up to `burst`
+
+    Buckets of the least recently seen keys are dropped beyond `max_keys`; a dropped key
+    simply starts again with a full bucket.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_keys: int, enabled: bool = True):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.enabled = enabled
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: Hashable) -> float:
+        """Consumes one token of `key`, and returns 0 or the seconds until a token is available"""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def check(self, key: Hashable) -> None:
+        wait = self.take(key)
+        if wait:
+            REQUESTS_SHED.labels(self.name, "throttled").inc()
+            raise TooManyRequestsException(
+                detail="Too many login attempts, please retry later", headers={"Retry-After": str(math.ceil(wait))}
+            )
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+config = AdmissionSettings()
+login_limiter = ConcurrencyLimiter(
+    "login",
+    limit=config.ADMISSION_LOGIN_CONCURRENCY,
+    max_queue=config.ADMISSION_LOGIN_QUEUE,
+    timeout=config.ADMISSION_QUEUE_TIMEOUT,
+    retry_after=config.ADMISSION_RETRY_AFTER,
+)
+registration_limiter = ConcurrencyLimiter(
+    "registration",
+    limit=config.ADMISSION_REGISTRATION_CONCURRENCY,
+    max_queue=config.ADMISSION_REGISTRATION_QUEUE,
+    timeout=config.ADMISSION_QUEUE_TIMEOUT,
+    retry_after=config.ADMISSION_RETRY_AFTER,
+)
+login_email_throttle = TokenBucket(
+    "login_email",
+    rate=config.LOGIN_THROTTLE_EMAIL_RATE,
+    burst=config.LOGIN_THROTTLE_EMAIL_BURST,
+    max_keys=config.LOGIN_THROTTLE_MAX_KEYS,
+    enabled=config.LOGIN_THROTTLE_ENABLED,
+)
+login_ip_throttle = TokenBucket(
+    "login_ip",
+    rate=config.LOGIN_THROTTLE_IP_RATE,
+    burst=config.LOGIN_THROTTLE_IP_BURST,
+    max_keys=config.LOGIN_THROTTLE_MAX_KEYS,
+    enabled=config.LOGIN_THROTTLE_ENABLED,
+)
@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+
+from app.core.metrics import CACHE_ENTRIES, CACHE_REMOVALS, CACHE_REQUESTS
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with least-recently-used eviction and per-entry expiry
+
+    Hits, misses, removals and size are also exported on /metrics, labelled with the cache name.
+
+    Args:
+        name: Label of the cache's metrics.
+        maxsize: Maximum number of entries kept before the least recently used one is evicted.
+        ttl: Default lifetime of an entry, in seconds.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        # Children resolved once, so lookups do not pay for the label lookup.
+        self._hits = CACHE_REQUESTS.labels(name, "hit")
+        self._misses = CACHE_REQUESTS.labels(name, "miss")
+        self._evictions = CACHE_REMOVALS.labels(name, "eviction")
+        self._expirations = CACHE_REMOVALS.labels(name, "expiration")
+        self._invalidations = CACHE_REMOVALS.labels(name, "invalidation")
+        self._size = CACHE_ENTRIES.labels(name)
+
+    def get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            self._misses.inc()
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            self._expirations.inc()
+            self._misses.inc()
+            self._size.set(len(self._entries))
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        self._hits.inc()
+        return value
+
+    def set(self, key: Hashable, value: object, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+            self._evictions.inc()
+        self._size.set(len(self._entries))
+
+    def invalidate(self, key: Hashable) -> None:
+        if self._entries.pop(key, None) is not None:
+            self.stats.invalidations += 1
+            self._invalidations.inc()
+            self._size.set(len(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size.set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,7 +1,27 @@
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Literal
+
 from pydantic import PostgresDsn, SecretStr
 from pydantic_settings import BaseSettings
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy import event, exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+from app.core.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_TIMEOUTS,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_CONNECTS,
+    DB_POOL_IDLE,
+    DB_POOL_INVALIDATIONS,
+)
+from app.core.queries import instrument_engine
+
+logger = logging.getLogger(__name__)
 
 
 class DBSettings(BaseSettings):
@@ -10,6 +30,22 @@ class DBSettings(BaseSettings):
     POSTGRES_DB: str
     POSTGRES_HOST: str
     POSTGRES_PASSWORD: SecretStr
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Open DB_POOL_SIZE connections at startup so the first requests do not pay for connecting.
+    DB_POOL_WARMUP: bool = True
+    # JSON list of postgresql+asyncpg:// DSNs of read replicas; reads use the primary when empty.
+    DB_REPLICA_URIS: list[str] = []
+    DB_REPLICA_STRATEGY: Literal["round_robin", "least_busy"] = "round_robin"
+    # Consecutive connection failures after which a replica is ejected, and for how long.
+    DB_REPLICA_MAX_FAILURES: int = 3
+    DB_REPLICA_EJECT_SECONDS: float = 30
+    # After a client writes, its reads go to the primary for this long so it sees its own writes.
+    DB_READ_YOUR_WRITES_SECONDS: float = 5
 
 
 config = DBSettings()
@@ -19,7 +55,150 @@ DATABASE_URI: PostgresDsn = (
 )
 
 
-engine = create_async_engine(DATABASE_URI)
+@dataclass
+class PoolMetrics:
+    """Counters of one engine's pool, also exported as db_pool_* series labelled with its name"""
+
+    name: str
+    checkouts: int = 0
+    checkout_timeouts: int = 0
+    checkout_wait_total: float = 0.0
+    checkout_wait_max: float = 0.0
+    connects: int = 0
+    invalidations: int = 0
+
+    def observe_checkout(self, wait: float) -> None:
+        self.checkouts += 1
+        self.checkout_wait_total += wait
+        self.checkout_wait_max = max(self.checkout_wait_max, wait)
+        DB_POOL_CHECKOUT_WAIT.labels(self.name).observe(wait)
+
+    def observe_timeout(self) -> None:
+        self.checkout_timeouts += 1
+        DB_POOL_CHECKOUT_TIMEOUTS.labels(self.name).inc()
+
+    def observe_connect(self) -> None:
+        self.connects += 1
+        DB_POOL_CONNECTS.labels(self.name).inc()
+
+    def observe_invalidation(self) -> None:
+        self.invalidations += 1
+        DB_POOL_INVALIDATIONS.labels(self.name).inc()
+
+    def observe_usage(self, pool: Pool) -> None:
+        DB_POOL_CHECKED_OUT.labels(self.name).set(pool.checkedout())
+        DB_POOL_IDLE.labels(self.name).set(pool.checkedin())
+
+
+# Keyed by pool name rather than held by the pool, so the counts survive dispose() replacing the pool.
+_pool_metrics: dict[str, PoolMetrics] = {}
+
+
+def get_pool_metrics(name: str) -> PoolMetrics:
+    if name not in _pool_metrics:
+        _pool_metrics[name] = PoolMetrics(name)
+    return _pool_metrics[name]
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # The engine's pool_logging_name tells the primary and each replica apart.
+    @property
+    def metrics(self) -> PoolMetrics:
+        return get_pool_metrics(self._orig_logging_name or "default")
+
+    # _do_get is where the pool waits for a free connection (up to pool_timeout).
+    def _do_get(self):
+        metrics = self.metrics
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            metrics.observe_timeout()
+            raise
+        metrics.observe_checkout(time.perf_counter() - start)
+        metrics.observe_usage(self)
+        return connection
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self.metrics.observe_usage(self)
+
+
+def create_engine(uri: str, name: str) -> AsyncEngine:
+    new_engine = create_async_engine(
+        uri,
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name=name,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        connect_args={"prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE},
+    )
+    metrics = get_pool_metrics(name)
+
+    @event.listens_for(new_engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.observe_connect()
+
+    @event.listens_for(new_engine.sync_engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.observe_invalidation()
+
+    instrument_engine(new_engine)
+
+    return new_engine
+
+
+def pool_status(target: AsyncEngine | None = None) -> dict:
+    pool = (target or engine).pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": pool.overflow(),
+        **asdict(pool.metrics),
+    }
+
+
+async def warm_pool(target: AsyncEngine, size: int) -> int:
+    """
+    Opens `size` connections at once and runs SELECT 1 on each, returning how many were warmed
+
+    The first statement on a connection also loads asyncpg's type codecs, so warmed connections
+    serve their first request without that cost. Failures are logged, not raised, so an unreachable
+    replica does not prevent startup, and every connection that did open is returned to the pool.
+
+    Args:
+        target: Engine whose pool is warmed.
+        size: Number of connections to open, capped at the pool size so none is an overflow connection.
+    """
+    size = min(size, target.pool.size())
+    connections = [target.connect() for _ in range(size)]
+    try:
+        # Started together, so the pool has to open a distinct connection for each of them. The
+        # gathers wait for every task instead of failing fast, so nothing opens after the cleanup.
+        started = await asyncio.gather(*(connection.start() for connection in connections), return_exceptions=True)
+        opened = [connection for connection in connections if connection.sync_connection is not None]
+        selected = await asyncio.gather(
+            *(connection.execute(text("SELECT 1")) for connection in opened), return_exceptions=True
+        )
+    finally:
+        await asyncio.gather(
+            *(connection.close() for connection in connections if connection.sync_connection is not None),
+            return_exceptions=True,
+        )
+    warmed = sum(not isinstance(result, BaseException) for result in selected)
+    errors = [result for result in (*started, *selected) if isinstance(result, BaseException)]
+    if errors:
+        logger.warning(
+            "Warmed %d of %d connections of %s", warmed, size, target.url.render_as_string(), exc_info=errors[0]
+        )
+    return warmed
+
+
+engine = create_engine(DATABASE_URI, "primary")
 db_session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
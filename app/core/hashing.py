@@ -1,11 +1,220 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Literal
+
 import bcrypt
+from pydantic_settings import BaseSettings
+
+from app.core.metrics import (
+    PASSWORD_HASH_CALIBRATION,
+    PASSWORD_HASH_DURATION,
+    PASSWORD_HASH_IN_FLIGHT,
+    PASSWORD_HASH_QUEUE_WAIT,
+    PASSWORD_HASH_REJECTED,
+    PASSWORD_HASH_ROUNDS,
+)
+from app.utils.exceptions import ServiceUnavailableException
+
+
+class HashingSettings(BaseSettings):
+    HASHING_EXECUTOR: Literal["thread", "process"] = "thread"
+    HASHING_MAX_WORKERS: int = 4
+    HASHING_MAX_QUEUE: int = 64
+    HASHING_RETRY_AFTER: int = 1
+    HASHING_ROUNDS: int | None = None
+    HASHING_TARGET_MS: float = 250
+    # Calibration never goes below the historical default, so a slow host cannot weaken stored hashes.
+    HASHING_MIN_ROUNDS: int = 12
+    HASHING_MAX_ROUNDS: int = 16
+
 
+logger = logging.getLogger(__name__)
 
-def get_password_hash(password: str) -> str:
-    salt = bcrypt.gensalt()
+DEFAULT_ROUNDS = 12
+
+
+def get_password_hash(password: str, rounds: int = DEFAULT_ROUNDS) -> str:
+    salt = bcrypt.gensalt(rounds=rounds)
     hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
     return hashed.decode("utf-8")
 
 
 def verify_password(plain_password: str, password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8"), password.encode("utf-8"))
+
+
+def get_hash_rounds(password: str) -> int | None:
+    # bcrypt hashes look like $2b$<rounds>$<salt+digest>
+    try:
+        return int(password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _timed(func: Callable, *args) -> tuple[object, float]:
+    # Module level so it can be pickled into a process pool.
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+@dataclass
+class HashingMetrics:
+    completed: int = 0
+    rejected: int = 0
+    in_flight: int = 0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    hash_time_total: float = 0.0
+    hash_time_max: float = 0.0
+
+    def observe(self, queue_wait: float, hash_time: float) -> None:
+        self.completed += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.hash_time_total += hash_time
+        self.hash_time_max = max(self.hash_time_max, hash_time)
+        PASSWORD_HASH_QUEUE_WAIT.observe(queue_wait)
+        PASSWORD_HASH_DURATION.observe(hash_time)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a worker pool so password hashing never blocks the event loop
+
+    Args:
+        executor: "thread" or "process" pool. bcrypt releases the GIL, so threads are usually enough.
+        max_workers: Number of concurrent bcrypt operations.
+        max_queue: Maximum number of operations waiting for a worker before new ones are rejected.
+        rounds: bcrypt work factor used for new hashes until calibrate() picks one.
+        retry_after: Value of the Retry-After header of rejected operations.
+    """
+
+    def __init__(
+        self,
+        executor: str = "thread",
+        max_workers: int = 4,
+        max_queue: int = 64,
+        rounds: int = DEFAULT_ROUNDS,
+        retry_after: int = 1,
+    ):
+        self.executor_type = executor
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.rounds = rounds
+        PASSWORD_HASH_ROUNDS.set(rounds)
+        self.calibration: dict[int, float] = {}
+        self.metrics = HashingMetrics()
+        self._executor: Executor | None = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hashing")
+        return self._executor
+
+    async def _run(self, func: Callable, *args):
+        if self.metrics.in_flight >= self.max_workers + self.max_queue:
+            self.metrics.rejected += 1
+            PASSWORD_HASH_REJECTED.inc()
+            raise ServiceUnavailableException(
+                detail="Server is busy, please retry later", headers={"Retry-After": str(self.retry_after)}
+            )
+        self.metrics.in_flight += 1
+        PASSWORD_HASH_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, hash_time = await loop.run_in_executor(self._get_executor(), _timed, func, *args)
+        finally:
+            self.metrics.in_flight -= 1
+            PASSWORD_HASH_IN_FLIGHT.dec()
+        self.metrics.observe(time.perf_counter() - start - hash_time, hash_time)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password, self.rounds)
+
+    async def hash_many(self, passwords: list[str]) -> list[str]:
+        # Submit at most max_workers hashes at a time so a large batch leaves queue room for other requests.
+        hashed = []
+        for i in range(0, len(passwords), self.max_workers):
+            hashed.extend(
+                await asyncio.gather(*(self.hash(password) for password in passwords[i : i + self.max_workers]))
+            )
+        return hashed
+
+    async def verify(self, plain_password: str, password: str) -> bool:
+        return await self._run(verify_password, plain_password, password)
+
+    def needs_rehash(self, password: str) -> bool:
+        # Only ever upgrade: a hash stronger than the current work factor is left alone.
+        rounds = get_hash_rounds(password)
+        return rounds is None or rounds < self.rounds
+
+    async def calibrate(self, target_ms: float, min_rounds: int, max_rounds: int) -> int:
+        """
+        Picks the highest work factor whose hash time stays within the target on this machine
+
+        Args:
+            target_ms: Latency budget for a single hash, in milliseconds.
+            min_rounds: Lowest work factor accepted, even if it exceeds the budget.
+            max_rounds: Highest work factor tried.
+        """
+        loop = asyncio.get_running_loop()
+        timings = {}
+        rounds = min_rounds
+        for candidate in range(min_rounds, max_rounds + 1):
+            _, elapsed = await loop.run_in_executor(
+                self._get_executor(), _timed, get_password_hash, "calibration", candidate
+            )
+            timings[candidate] = elapsed
+            PASSWORD_HASH_CALIBRATION.labels(str(candidate)).set(elapsed)
+            if elapsed * 1000 > target_ms:
+                break
+            rounds = candidate
+        self.rounds = rounds
+        self.calibration = timings
+        PASSWORD_HASH_ROUNDS.set(rounds)
+        logger.info(
+            "Calibrated bcrypt to %d rounds for a %.0fms target",
+            rounds,
+            target_ms,
+            extra={"timings": timings},
+        )
+        return rounds
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+config = HashingSettings()
+password_hasher = PasswordHasher(
+    executor=config.HASHING_EXECUTOR,
+    max_workers=config.HASHING_MAX_WORKERS,
+    max_queue=config.HASHING_MAX_QUEUE,
+    rounds=config.HASHING_ROUNDS or DEFAULT_ROUNDS,
+    retry_after=config.HASHING_RETRY_AFTER,
+)
+
+
+async def calibrate_password_hasher() -> None:
+    if config.HASHING_ROUNDS is not None:
+        return
+    await password_hasher.calibrate(config.HASHING_TARGET_MS, config.HASHING_MIN_ROUNDS, config.HASHING_MAX_ROUNDS)
+
+
+if __name__ == "__main__":
+    # Prints the calibrated work factor, so entrypoint.sh can pin a single value for all workers.
+    asyncio.run(calibrate_password_hasher())
+    print(password_hasher.rounds)
+    password_hasher.shutdown()
@@ -0,0 +1,248 @@
+import asyncio
+import functools
+import os
+import time
+from collections.abc import Callable
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.queries import finish_query_stats, start_query_stats
+from app.core.timing import current_timing, start_timing
+
+# When PROMETHEUS_MULTIPROC_DIR is set (one directory shared by all uvicorn workers), every worker
+# writes its samples there and /metrics aggregates them, whichever worker serves the scrape.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "Number of HTTP requests.",
+    ["method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response starts.",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Number of SQL statements run per HTTP request.",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Number of HTTP requests being handled.",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight",
+    "Number of requests admitted by a concurrency limiter.",
+    ["limiter"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Number of requests waiting for a concurrency limiter.",
+    ["limiter"],
+    multiprocess_mode="livesum",
+)
+REQUESTS_SHED = Counter(
+    "admission_requests_shed_total",
+    "Number of requests rejected by admission control.",
+    ["limiter", "reason"],
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection.",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Number of checkouts that gave up after the pool timeout.",
+    ["engine"],
+)
+DB_POOL_CONNECTS = Counter(
+    "db_pool_connects_total",
+    "Number of database connections opened by the pool.",
+    ["engine"],
+)
+DB_POOL_INVALIDATIONS = Counter(
+    "db_pool_invalidations_total",
+    "Number of pooled connections invalidated after an error.",
+    ["engine"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Number of pooled connections in use.",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_IDLE = Gauge(
+    "db_pool_idle",
+    "Number of pooled connections waiting to be checked out.",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Number of in-process cache lookups.",
+    ["cache", "result"],
+)
+CACHE_REMOVALS = Counter(
+    "cache_removals_total",
+    "Number of entries removed from an in-process cache.",
+    ["cache", "reason"],
+)
+CACHE_ENTRIES = Gauge(
+    "cache_entries",
+    "Number of entries held by an in-process cache.",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Time a bcrypt operation waited for a hashing worker.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "Time spent in bcrypt by a hashing worker.",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight",
+    "Number of bcrypt operations running or waiting for a hashing worker.",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Number of bcrypt operations rejected because the hashing queue was full.",
+)
+# Per process, so workers that ended up with different work factors are visible.
+PASSWORD_HASH_ROUNDS = Gauge(
+    "password_hash_rounds",
+    "bcrypt work factor used for new password hashes.",
+    multiprocess_mode="liveall",
+)
+PASSWORD_HASH_CALIBRATION = Gauge(
+    "password_hash_calibration_seconds",
+    "Time a single hash took at each work factor tried during calibration.",
+    ["rounds"],
+    multiprocess_mode="liveall",
+)
+
+
+class MetricsMiddleware:
+    """
+    Records request count, latency, status and SQL statement count per route, and adds a Server-Timing header
+
+    This is a plain ASGI middleware so the endpoint runs in the same context and can report
+    its phases through app.core.timing.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = start_timing()
+        query_stats = start_query_stats()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timing.descriptions["db"] = f"{query_stats.count} queries"
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.header().encode("latin-1")))
+                message = {**message, "headers": headers}
+                REQUEST_LATENCY.labels(scope["method"], route_name(scope)).observe(time.perf_counter() - timing.start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_name(scope)
+            REQUESTS.labels(scope["method"], route, str(status_code)).inc()
+            REQUEST_QUERIES.labels(scope["method"], route).observe(query_stats.count)
+            finish_query_stats(query_stats, f"{scope['method']} {route}")
+
+
+def route_name(scope: Scope) -> str:
+    # The route template, not the raw path, keeps label cardinality bounded.
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that tracks in-flight requests and reports response serialization time
+
+    Serialization is the time between the endpoint returning and the response being built,
+    which covers response_model validation and JSON encoding.
+    """
+
+    def get_route_handler(self) -> Callable:
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+
+            @functools.wraps(endpoint)
+            async def timed_endpoint(*args, **kwargs):
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    timing = current_timing()
+                    if timing is not None:
+                        timing.endpoint_done = time.perf_counter()
+
+            self.dependant.call = timed_endpoint
+
+        handler = super().get_route_handler()
+        method = ",".join(sorted(self.methods))
+
+        async def timed_handler(request: Request) -> Response:
+            in_progress = REQUESTS_IN_PROGRESS.labels(method, self.path)
+            in_progress.inc()
+            try:
+                response = await handler(request)
+            finally:
+                in_progress.dec()
+            timing = current_timing()
+            if timing is not None and timing.endpoint_done is not None:
+                timing.add("serialization", time.perf_counter() - timing.endpoint_done)
+            return response
+
+        return timed_handler
+
+
+def mark_process_dead() -> None:
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def metrics_endpoint(request: Request) -> Response:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
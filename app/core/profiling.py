@@ -0,0 +1,146 @@
+import hashlib
+import hmac
+import itertools
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from pydantic_settings import BaseSettings
+from pyinstrument import Profiler
+from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+from pyinstrument.session import Session
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_HEADER = b"x-profile"
+
+
+class ProfilingSettings(BaseSettings):
+    PROFILING_INTERVAL: float = 0.001
+    PROFILING_MAX_STORED: int = 50
+    # Optional directory shared by all workers, so a profile can be fetched from any of them.
+    PROFILING_DIR: str | None = None
+
+
+@dataclass
+class ProfileRecord:
+    id: str
+    method: str
+    path: str
+    status_code: int
+    duration: float
+    created_at: float = field(default_factory=time.time)
+    session: Session | None = field(default=None, repr=False)
+
+
+class RequestProfiler:
+    """
+    Decides which requests are profiled and keeps the resulting profiles
+
+    A request is profiled when it carries a valid signed X-Profile header, or when an admin
+    armed profiling for its path prefix. Otherwise the middleware passes it straight through.
+
+    Args:
+        secret: Key used to sign X-Profile headers.
+        interval: Sampling interval, in seconds.
+        max_stored: Number of profiles kept in memory.
+        directory: Directory where speedscope files are also written, if any.
+    """
+
+    def __init__(self, secret: str, interval: float = 0.001, max_stored: int = 50, directory: str | None = None):
+        self.secret = secret.encode("utf-8")
+        self.interval = interval
+        self.directory = Path(directory) if directory else None
+        self.profiles: deque[ProfileRecord] = deque(maxlen=max_stored)
+        self.armed: dict[str, int] = {}
+        self._ids = itertools.count(1)
+
+    def sign(self, method: str, path: str, expires_at: int) -> str:
+        message = f"{method.upper()} {path} {expires_at}".encode()
+        return f"{expires_at}.{hmac.new(self.secret, message, hashlib.sha256).hexdigest()}"
+
+    def verify(self, value: str, method: str, path: str) -> bool:
+        expires_at, _, _ = value.partition(".")
+        if not expires_at.isdigit() or int(expires_at) < time.time():
+            return False
+        return hmac.compare_digest(value, self.sign(method, path, int(expires_at)))
+
+    def arm(self, path_prefix: str, count: int) -> None:
+        self.armed[path_prefix] = count
+
+    def should_profile(self, scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return self.verify(value.decode("latin-1"), scope["method"], scope["path"])
+        for prefix, remaining in self.armed.items():
+            if scope["path"].startswith(prefix):
+                if remaining <= 1:
+                    del self.armed[prefix]
+                else:
+                    self.armed[prefix] = remaining - 1
+                return True
+        return False
+
+    def add(self, scope: Scope, status_code: int, session: Session) -> ProfileRecord:
+        record = ProfileRecord(
+            # Prefixed with the pid so ids stay unique across workers sharing a directory.
+            id=f"{os.getpid()}-{next(self._ids)}",
+            method=scope["method"],
+            path=scope["path"],
+            status_code=status_code,
+            duration=session.duration,
+            session=session,
+        )
+        self.profiles.append(record)
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / f"{record.id}.speedscope.json").write_text(SpeedscopeRenderer().render(session))
+        return record
+
+    def render(self, profile_id: str, output_format: str) -> str | None:
+        for record in self.profiles:
+            if record.id == profile_id:
+                renderer = HTMLRenderer() if output_format == "html" else SpeedscopeRenderer()
+                return renderer.render(record.session)
+        if self.directory is not None and output_format == "speedscope":
+            path = self.directory / f"{Path(profile_id).name}.speedscope.json"
+            if path.is_file():
+                return path.read_text()
+        return None
+
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        profiler = Profiler(interval=self.profiler.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session = profiler.stop()
+            self.profiler.add(scope, status_code, session)
+
+
+config = ProfilingSettings()
+request_profiler = RequestProfiler(
+    os.environ["SECRET_KEY"],
+    interval=config.PROFILING_INTERVAL,
+    max_stored=config.PROFILING_MAX_STORED,
+    directory=config.PROFILING_DIR,
+)
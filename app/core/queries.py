@@ -0,0 +1,130 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from pydantic_settings import BaseSettings
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.timing import add_timing
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+# Plans show bound parameters as quoted literals, e.g. (email = 'someone@example.com'::text).
+PLAN_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+class QuerySettings(BaseSettings):
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+    SLOW_QUERY_EXPLAIN: bool = False
+    N_PLUS_ONE_THRESHOLD: int = 10
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    duration: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def start_query_stats() -> QueryStats:
+    stats = QueryStats()
+    _current.set(stats)
+    return stats
+
+
+def current_query_stats() -> QueryStats | None:
+    return _current.get()
+
+
+def finish_query_stats(stats: QueryStats, label: str) -> None:
+    for statement, count in stats.statements.items():
+        if count >= config.N_PLUS_ONE_THRESHOLD:
+            logger.warning(
+                "Possible N+1: %s ran the same statement %d times: %s",
+                label,
+                count,
+                statement,
+                extra={"statement": statement, "executions": count},
+            )
+
+
+def redact(parameters) -> object:
+    # Keep the shape of the parameters for debugging but never their values.
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, list | tuple):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def explain(conn, statement: str, parameters) -> str | None:
+    conn.info["explaining"] = True
+    try:
+        # Inside a savepoint, so a failing EXPLAIN does not abort the request's transaction.
+        with conn.begin_nested():
+            result = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+            return PLAN_LITERAL.sub("'?'", "\n".join(row[0] for row in result))
+    except Exception:
+        logger.debug("Could not EXPLAIN slow query", exc_info=True)
+        return None
+    finally:
+        conn.info["explaining"] = False
+
+
+def log_slow_query(conn, statement: str, parameters, context, executemany: bool, elapsed: float) -> None:
+    plan = None
+    if (
+        config.SLOW_QUERY_EXPLAIN
+        and not executemany
+        and not getattr(context, "is_server_side", False)
+        and statement.lstrip().upper().startswith(EXPLAINABLE)
+    ):
+        plan = explain(conn, statement, parameters)
+    shape = f"{len(parameters)} parameter sets" if executemany else redact(parameters)
+    # The details are in the message itself, since no formatter here renders `extra`.
+    logger.warning(
+        "Slow query took %.1fms: %s\nParameters: %s%s",
+        elapsed * 1000,
+        statement,
+        shape,
+        f"\nPlan:\n{plan}" if plan else "",
+        extra={"statement": statement, "parameters": shape, "plan": plan},
+    )
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Times every statement run by the engine and attributes it to the current request
+
+    Statements slower than SLOW_QUERY_THRESHOLD_MS are logged with redacted parameters and,
+    if SLOW_QUERY_EXPLAIN is set, their EXPLAIN plan (never ANALYZE, so nothing runs twice).
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        if conn.info.get("explaining"):
+            return
+        add_timing("db", elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += elapsed
+            stats.statements[statement] += 1
+        if elapsed * 1000 >= config.SLOW_QUERY_THRESHOLD_MS:
+            log_slow_query(conn, statement, parameters, context, executemany, elapsed)
+
+
+config = QuerySettings()
@@ -0,0 +1,175 @@
+import itertools
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Annotated
+
+from fastapi import Depends, Request
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.database import config, create_engine, db_session, get_db_session
+
+logger = logging.getLogger(__name__)
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: AsyncEngine = field(repr=False)
+    session_factory: sessionmaker = field(repr=False)
+    failures: int = 0
+    ejected_until: float = 0.0
+
+    def is_available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def busy(self) -> int:
+        return self.engine.pool.checkedout()
+
+
+class ReplicaRouter:
+    """
+    Picks the read replica a session is opened on
+
+    Replicas are picked round-robin or by the fewest checked-out connections. A replica failing
+    `max_failures` times in a row is ejected for `eject_seconds`, then gets traffic again; when
+    every replica is ejected, reads fall back to the primary.
+
+    Args:
+        replicas: The read replicas, possibly none.
+        strategy: "round_robin" or "least_busy".
+        max_failures: Consecutive connection failures that eject a replica.
+        eject_seconds: How long an ejected replica receives no traffic.
+    """
+
+    def __init__(self, replicas: list[Replica], strategy: str, max_failures: int, eject_seconds: float):
+        self.replicas = replicas
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self._counter = itertools.count()
+
+    def choose(self) -> Replica | None:
+        now = time.monotonic()
+        available = [replica for replica in self.replicas if replica.is_available(now)]
+        if not available:
+            return None
+        if self.strategy == "least_busy":
+            return min(available, key=Replica.busy)
+        return available[next(self._counter) % len(available)]
+
+    def record_success(self, replica: Replica) -> None:
+        replica.failures = 0
+
+    def record_failure(self, replica: Replica) -> None:
+        replica.failures += 1
+        if replica.failures >= self.max_failures:
+            logger.warning("Ejecting read replica %s for %ss", replica.name, self.eject_seconds)
+            replica.failures = 0
+            replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+def is_connection_error(error: BaseException) -> bool:
+    # Query errors (bad SQL, constraint violations) say nothing about the replica's health.
+    if isinstance(error, exc.DBAPIError):
+        return error.connection_invalidated or isinstance(error, exc.OperationalError | exc.InterfaceError)
+    return isinstance(error, OSError)
+
+
+def reads_from_primary(request: Request) -> bool:
+    until = request.cookies.get(READ_PRIMARY_COOKIE, "")
+    return until.isdigit() and int(until) > time.time()
+
+
+def choose_replica(request: Request) -> Replica | None:
+    # Writes need the primary anyway, so their reads (e.g. the auth lookup) share its connection.
+    if request.method not in SAFE_METHODS or reads_from_primary(request):
+        return None
+    return replica_router.choose()
+
+
+def read_session_factory(request: Request) -> Callable[[], AsyncSession]:
+    """Returns the session factory of a replica for this request's reads, or of the primary"""
+    replica = choose_replica(request)
+    return db_session if replica is None else replica.session_factory
+
+
+async def get_read_db_session(request: Request, db: Annotated[AsyncSession, Depends(get_db_session)]) -> AsyncSession:
+    """
+    Yields a session for read-only queries, opened on a replica when one is configured and available
+
+    Falls back to the request's primary session, which connects lazily and so costs nothing
+    when unused, for writes, for clients that wrote recently, or when no replica is available.
+    """
+    replica = choose_replica(request)
+    if replica is None:
+        yield db
+        return
+    async with replica.session_factory() as session:
+        try:
+            yield session
+        except Exception as e:
+            if is_connection_error(e):
+                replica_router.record_failure(replica)
+            raise
+        replica_router.record_success(replica)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Marks clients that just wrote so their reads go to the primary until replicas catch up
+
+    A successful request with an unsafe method gets a short-lived cookie holding the time
+    until which get_read_db_session skips the replicas. Does nothing without replicas.
+    """
+
+    def __init__(self, app: ASGIApp, router: ReplicaRouter, window: float):
+        self.app = app
+        self.router = router
+        self.window = window
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not self.router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time() + self.window) + 1
+                cookie = (
+                    f"{READ_PRIMARY_COOKIE}={until}; Max-Age={int(self.window) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def create_replica(uri: str) -> Replica:
+    name = make_url(uri).render_as_string(hide_password=True)
+    engine = create_engine(uri, name)
+    return Replica(
+        name=name,
+        engine=engine,
+        session_factory=sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False),
+    )
+
+
+replica_router = ReplicaRouter(
+    [create_replica(uri) for uri in config.DB_REPLICA_URIS],
+    strategy=config.DB_REPLICA_STRATEGY,
+    max_failures=config.DB_REPLICA_MAX_FAILURES,
+    eject_seconds=config.DB_REPLICA_EJECT_SECONDS,
+)
@@ -1,16 +1,41 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
-from app.routers import users
+from app.core.database import config as db_config
+from app.core.database import db_session, engine, warm_pool
+from app.core.hashing import calibrate_password_hasher, password_hasher
+from app.core.metrics import MetricsMiddleware, mark_process_dead, metrics_endpoint
+from app.core.profiling import ProfilerMiddleware, request_profiler
+from app.core.replicas import ReadYourWritesMiddleware, replica_router
+from app.routers import profiles, roles, users
+from app.utils.outbox import outbox_relay
+from app.utils.roles import config as roles_config
+from app.utils.roles import role_registry
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Lifespan: Starting up...")
+    await calibrate_password_hasher()
+    if db_config.DB_POOL_WARMUP:
+        engines = [engine, *(replica.engine for replica in replica_router.replicas)]
+        await asyncio.gather(*(warm_pool(target, db_config.DB_POOL_SIZE) for target in engines))
+    async with db_session() as session:
+        await role_registry.load(session)
+    role_registry.start_reloading(db_session, roles_config.ROLES_RELOAD_INTERVAL)
+    outbox_relay.start()
     yield
     print("Lifespan: Shutting down...")
+    await outbox_relay.stop()
+    await role_registry.stop_reloading()
+    password_hasher.shutdown()
+    await replica_router.dispose()
+    await engine.dispose()
+    mark_process_dead()
 
 
 app = FastAPI(
@@ -18,6 +43,7 @@ app = FastAPI(
     description="A FastAPI project with PostgreSQL and Alembic integration.",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 origins = [
@@ -30,6 +56,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(ReadYourWritesMiddleware, router=replica_router, window=db_config.DB_READ_YOUR_WRITES_SECONDS)
+app.add_middleware(ProfilerMiddleware, profiler=request_profiler)
+app.add_middleware(MetricsMiddleware)
+
+app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
 
 app.include_router(users.router, prefix="/api")
+app.include_router(roles.router, prefix="/api")
+app.include_router(profiles.router, prefix="/api")
@@ -1,2 +1,4 @@
+from .outbox import OutboxEvent  # noqa: F401
 from .roles import Role  # noqa: F401
+from .stats import UserStats  # noqa: F401
 from .users import User  # noqa: F401
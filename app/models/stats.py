@@ -0,0 +1,12 @@
+from sqlalchemy import Column, ForeignKey, Integer
+
+from app.core.database import Base
+
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    # One row of counters per role, updated in the same transaction as the users they count.
+    role_id = Column(Integer, ForeignKey("roles.id"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0, server_default="0")
+    active = Column(Integer, nullable=False, default=0, server_default="0")
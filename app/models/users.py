@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, func
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -13,5 +13,18 @@ class User(Base):
     password = Column(String, nullable=False)
     is_active = Column(Boolean, default=False)
     role_id = Column(Integer, ForeignKey("roles.id"), nullable=False, default=4)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped on every change to the row; used for ETags and optimistic concurrency.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     role = relationship("Role")
+
+    __mapper_args__ = {"version_id_col": version}
+    # The pg_trgm GIN indexes on username and email (migration 0009) are not declared here,
+    # since create_all would then require the extension on every database; app/alembic/env.py
+    # excludes them from autogenerate.
+    __table_args__ = (
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+        Index("ix_users_role_id_is_active_id", role_id, is_active, id),
+        Index("ix_users_inactive", id, postgresql_where=is_active.is_(False)),
+    )
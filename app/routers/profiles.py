@@ -0,0 +1,78 @@
+import time
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, Query, Response, status
+
+from app.core.metrics import TimedRoute
+from app.core.profiling import request_profiler
+from app.models.roles import RolePrivilege
+from app.schemas.profiles import ProfileArm, ProfileResponse, ProfileSignRequest, ProfileSignResponse
+from app.utils.exceptions import NotFoundException
+from app.utils.users import require_roles
+
+router = APIRouter(
+    prefix="/profiles",
+    tags=["profiles"],
+    route_class=TimedRoute,
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ADMIN,
+                ]
+            )
+        )
+    ],
+)
+
+
+@router.get(
+    "/",
+    response_model=list[ProfileResponse],
+    summary="List request profiles",
+    description="List the request profiles kept by this worker. Requires ADMIN role privilege.",
+    response_description="A list of profile summaries.",
+)
+async def get_profiles_api():
+    return list(request_profiler.profiles)
+
+
+@router.post(
+    "/arm",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Profile upcoming requests",
+    description="Profile the next requests whose path starts with the given prefix. Requires ADMIN role privilege.",
+)
+async def arm_profiler_api(arm: ProfileArm):
+    request_profiler.arm(arm.path_prefix, arm.count)
+
+
+@router.post(
+    "/sign",
+    response_model=ProfileSignResponse,
+    summary="Sign a profiling header",
+    description=(
+        "Return an X-Profile header value that enables profiling of one method and path until it expires. "
+        "Requires ADMIN role privilege."
+    ),
+    response_description="The header to send with the request to profile.",
+)
+async def sign_profile_api(sign_request: ProfileSignRequest):
+    expires_at = int(time.time()) + sign_request.expires_in
+    return ProfileSignResponse(value=request_profiler.sign(sign_request.method, sign_request.path, expires_at))
+
+
+@router.get(
+    "/{profile_id}",
+    summary="Download a request profile",
+    description="Download a profile as speedscope JSON or a pyinstrument HTML report. Requires ADMIN role privilege.",
+    response_description="The rendered profile.",
+)
+async def get_profile_api(
+    profile_id: str, output_format: Annotated[Literal["speedscope", "html"], Query(alias="format")] = "speedscope"
+):
+    rendered = request_profiler.render(profile_id, output_format)
+    if rendered is None:
+        raise NotFoundException(detail="Profile not found")
+    media_type = "text/html" if output_format == "html" else "application/json"
+    return Response(rendered, media_type=media_type)
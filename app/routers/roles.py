@@ -0,0 +1,58 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_db_session
+from app.core.metrics import TimedRoute
+from app.models.roles import RolePrivilege
+from app.schemas.roles import RoleResponse
+from app.utils.roles import role_registry
+from app.utils.users import require_roles
+
+router = APIRouter(prefix="/roles", tags=["roles"], route_class=TimedRoute)
+
+
+@router.get(
+    "/",
+    response_model=list[RoleResponse],
+    summary="List all roles",
+    description="Retrieve the roles known to this server, served from memory. Requires ANY role privilege.",
+    response_description="A list of role objects.",
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ANY,
+                ]
+            )
+        )
+    ],
+)
+async def get_roles_api():
+    return role_registry.all()
+
+
+@router.post(
+    "/refresh",
+    response_model=list[RoleResponse],
+    summary="Reload roles",
+    description=(
+        "Reload the in-memory role registry of the worker serving the request from the database. Other "
+        "workers pick up the change on their next periodic reload, within ROLES_RELOAD_INTERVAL seconds. "
+        "Requires ADMIN role privilege."
+    ),
+    response_description="The reloaded list of role objects.",
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ADMIN,
+                ]
+            )
+        )
+    ],
+)
+async def refresh_roles_api(db: Annotated[AsyncSession, Depends(get_db_session)]):
+    await role_registry.load(db)
+    return role_registry.all()
@@ -1,34 +1,74 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Body, Depends, Header, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 
+from app.core.admission import login_email_throttle, login_ip_throttle, login_limiter, registration_limiter
 from app.core.database import get_db_session
-from app.core.hashing import verify_password
+from app.core.hashing import password_hasher
+from app.core.metrics import TimedRoute
+from app.core.replicas import get_read_db_session, read_session_factory
 from app.models.roles import RolePrivilege
 from app.schemas.tokens import Token
-from app.schemas.users import UserCreate, UserLogin, UserResponse, UserUpdate
-from app.utils.exceptions import BadRedquestException, NotFoundException, UnauthorizedException
+from app.schemas.users import (
+    UserBulkCreateResponse,
+    UserBulkStatusResponse,
+    UserBulkStatusUpdate,
+    UserCreate,
+    UserLogin,
+    UserResponse,
+    UserRoleUpdate,
+    UserStatsResponse,
+    UserUpdate,
+)
+from app.utils.conditional import if_match, if_none_match, make_list_etag
+from app.utils.exceptions import (
+    BadRedquestException,
+    NotFoundException,
+    PreconditionFailedException,
+    UnauthorizedException,
+)
+from app.utils.search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, SEARCH_MIN_QUERY_LENGTH, user_search
+from app.utils.stats import get_user_stats
 from app.utils.users import (
+    BULK_CREATE_MAX_SIZE,
+    USERS_MAX_PAGE_SIZE,
+    USERS_PAGE_SIZE,
     activate_user,
+    close_export,
     create_access_token,
     create_user,
+    create_users,
     deactivate_user,
+    export_users,
     get_user_by_email,
     get_user_by_id,
+    get_user_version,
     get_users,
+    rehash_user_password,
     require_roles,
+    serialize_user,
+    serialize_users,
+    set_users_status,
     update_user,
+    update_user_role,
+    user_etag,
 )
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=TimedRoute)
 
 
 @router.get(
     "/",
     response_model=list[UserResponse],
-    summary="List all users",
-    description="Retrieve a list of all users. Requires ANY role privilege.",
+    summary="List users",
+    description=(
+        "Retrieve one page of users ordered by ID, optionally filtered by status and role. "
+        "The cursor of the next page, if any, is returned in the X-Next-Cursor header. "
+        "Requires ANY role privilege."
+    ),
     response_description="A list of user objects.",
     dependencies=[
         Depends(
@@ -40,8 +80,22 @@ router = APIRouter(prefix="/users", tags=["users"])
         )
     ],
 )
-async def get_users_api(db: Annotated[AsyncSession, Depends(get_db_session)]):
-    return await get_users(db)
+async def get_users_api(
+    db: Annotated[AsyncSession, Depends(get_read_db_session)],
+    limit: Annotated[int, Query(ge=1, le=USERS_MAX_PAGE_SIZE)] = USERS_PAGE_SIZE,
+    after: Annotated[str | None, Query(description="Cursor returned in X-Next-Cursor")] = None,
+    is_active: bool | None = None,
+    role_id: int | None = None,
+    if_none_match_header: Annotated[str | None, Header(alias="If-None-Match")] = None,
+):
+    users, next_cursor = await get_users(db, limit=limit, after=after, is_active=is_active, role_id=role_id)
+    headers = {"ETag": make_list_etag(((user.id, user.version) for user in users), next_cursor)}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    if if_none_match(if_none_match_header, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # Returning a response skips the response_model pass; it only documents the schema.
+    return ORJSONResponse(serialize_users(users), headers=headers)
 
 
 @router.post(
@@ -55,14 +109,135 @@ async def create_user_api(
     user: UserCreate,
     db: Annotated[AsyncSession, Depends(get_db_session)],
 ):
-    return await create_user(db, user)
+    async with registration_limiter:
+        return await create_user(db, user)
+
+
+@router.post(
+    "/bulk",
+    response_model=UserBulkCreateResponse,
+    summary="Create users in bulk",
+    description=(
+        "Create many users in one request. Users whose email already exists are reported as duplicates. "
+        "Requires ADMIN role privilege."
+    ),
+    response_description="The outcome for each submitted user.",
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ADMIN,
+                ]
+            )
+        )
+    ],
+)
+async def create_users_api(
+    users: Annotated[list[UserCreate], Body(min_length=1, max_length=BULK_CREATE_MAX_SIZE)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+):
+    return await create_users(db, users)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    summary="Export users",
+    description=(
+        "Stream all users as NDJSON or CSV, optionally filtered by status and role. "
+        "Memory use does not depend on the number of users. Requires ANY role privilege."
+    ),
+    response_description="A stream of user records.",
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ANY,
+                ]
+            )
+        )
+    ],
+)
+async def export_users_api(
+    request: Request,
+    export_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+    is_active: bool | None = None,
+    role_id: int | None = None,
+):
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    rows = export_users(
+        export_format, is_active=is_active, role_id=role_id, session_factory=read_session_factory(request)
+    )
+    return StreamingResponse(
+        rows,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{export_format}"'},
+        # A client disconnecting while the response waits in send() leaves the generator suspended at a
+        # yield; closing it here releases the cursor and connection instead of waiting for the GC.
+        background=BackgroundTask(close_export, rows),
+    )
+
+
+@router.get(
+    "/stats",
+    response_model=UserStatsResponse,
+    summary="User statistics",
+    description=(
+        "Total, active and inactive user counts, overall and per role. Read from counters kept up to date "
+        "on every change, not by counting users. Requires ANY role privilege."
+    ),
+    response_description="The user counts.",
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ANY,
+                ]
+            )
+        )
+    ],
+)
+async def get_user_stats_api(db: Annotated[AsyncSession, Depends(get_read_db_session)]):
+    return await get_user_stats(db)
+
+
+@router.get(
+    "/search",
+    response_model=list[UserResponse],
+    summary="Search users",
+    description=(
+        "Find users whose username or email contains the query, best matches first. "
+        "Requires ADMIN or SUPPORT role privilege."
+    ),
+    response_description="The matching users.",
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ADMIN,
+                    RolePrivilege.SUPPORT,
+                ]
+            )
+        )
+    ],
+)
+async def search_users_api(
+    db: Annotated[AsyncSession, Depends(get_read_db_session)],
+    q: Annotated[str, Query(min_length=SEARCH_MIN_QUERY_LENGTH, max_length=100)],
+    limit: Annotated[int, Query(ge=1, le=SEARCH_MAX_LIMIT)] = SEARCH_DEFAULT_LIMIT,
+):
+    users = await user_search.search(db, q, limit)
+    return ORJSONResponse(serialize_users(users))
 
 
 @router.get(
     "/{user_id}",
     response_model=UserResponse,
     summary="Get a user by ID",
-    description="Retrieve a specific user by their ID. Requires ANY role privilege.",
+    description=(
+        "Retrieve a specific user by their ID. Answers 304 Not Modified when If-None-Match matches the "
+        "user's ETag. Requires ANY role privilege."
+    ),
     response_description="The requested user object.",
     dependencies=[
         Depends(
@@ -74,15 +249,73 @@ async def create_user_api(
         )
     ],
 )
-async def get_user_api(user_id: int, db: Annotated[AsyncSession, Depends(get_db_session)]):
-    return await get_user_by_id(db, user_id)
+async def get_user_api(
+    user_id: int,
+    db: Annotated[AsyncSession, Depends(get_read_db_session)],
+    if_none_match_header: Annotated[str | None, Header(alias="If-None-Match")] = None,
+):
+    if if_none_match_header is not None:
+        # Revalidation only needs the version, not the row.
+        version = await get_user_version(db, user_id)
+        if version is None:
+            raise NotFoundException(detail="User not found")
+        etag = user_etag(user_id, version)
+        if if_none_match(if_none_match_header, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    user = await get_user_by_id(db, user_id)
+    if not user:
+        raise NotFoundException(detail="User not found")
+    return ORJSONResponse(serialize_user(user), headers={"ETag": user_etag(user.id, user.version)})
+
+
+@router.put(
+    "/activate",
+    response_model=UserBulkStatusResponse,
+    summary="Activate users in bulk",
+    description="Activate the given users, or every user with the given role. Requires ADMIN role privilege.",
+    response_description="The number of activated users and the ids that were not found.",
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ADMIN,
+                ]
+            )
+        )
+    ],
+)
+async def activate_users_api(selection: UserBulkStatusUpdate, db: Annotated[AsyncSession, Depends(get_db_session)]):
+    return await set_users_status(db, True, ids=selection.ids, role_id=selection.role_id)
+
+
+@router.put(
+    "/deactivate",
+    response_model=UserBulkStatusResponse,
+    summary="Deactivate users in bulk",
+    description="Deactivate the given users, or every user with the given role. Requires ADMIN role privilege.",
+    response_description="The number of deactivated users and the ids that were not found.",
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ADMIN,
+                ]
+            )
+        )
+    ],
+)
+async def deactivate_users_api(selection: UserBulkStatusUpdate, db: Annotated[AsyncSession, Depends(get_db_session)]):
+    return await set_users_status(db, False, ids=selection.ids, role_id=selection.role_id)
 
 
 @router.put(
     "/{user_id}",
     response_model=UserResponse,
     summary="Update a user",
-    description="Update an existing user's details. Requires EDITOR role privilege.",
+    description=(
+        "Update an existing user's details. Send the user's ETag in If-Match to only update the version "
+        "you fetched. Requires EDITOR role privilege."
+    ),
     response_description="The updated user object.",
     dependencies=[
         Depends(
@@ -94,11 +327,21 @@ async def get_user_api(user_id: int, db: Annotated[AsyncSession, Depends(get_db_
         )
     ],
 )
-async def put_user_api(user_id: int, user: UserUpdate, db: Annotated[AsyncSession, Depends(get_db_session)]):
+async def put_user_api(
+    user_id: int,
+    user_data: UserUpdate,
+    response: Response,
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    if_match_header: Annotated[str | None, Header(alias="If-Match")] = None,
+):
     user = await get_user_by_id(db, user_id)
     if not user:
         raise NotFoundException(detail="User not found")
-    return await update_user(db, user_id, user)
+    if not if_match(if_match_header, user_etag(user.id, user.version)):
+        raise PreconditionFailedException(detail="User was modified since it was fetched")
+    user = await update_user(db, user, user_data, conditional=if_match_header is not None)
+    response.headers["ETag"] = user_etag(user.id, user.version)
+    return user
 
 
 @router.put(
@@ -147,6 +390,31 @@ async def deactivate_user_api(user_id: int, db: Annotated[AsyncSession, Depends(
     return await deactivate_user(db, user)
 
 
+@router.put(
+    "/role/{user_id}",
+    response_model=UserResponse,
+    summary="Change a user's role",
+    description="Assign a different role to a user and revoke their tokens. Requires ADMIN role privilege.",
+    response_description="The updated user object.",
+    dependencies=[
+        Depends(
+            require_roles(
+                [
+                    RolePrivilege.ADMIN,
+                ]
+            )
+        )
+    ],
+)
+async def put_user_role_api(
+    user_id: int, role_data: UserRoleUpdate, db: Annotated[AsyncSession, Depends(get_db_session)]
+):
+    user = await get_user_by_id(db, user_id)
+    if not user:
+        raise NotFoundException(detail="User not found")
+    return await update_user_role(db, user, role_data.role_id)
+
+
 @router.post(
     "/login",
     response_model=Token,
@@ -155,15 +423,22 @@ async def deactivate_user_api(user_id: int, db: Annotated[AsyncSession, Depends(
     response_description="An access token for the authenticated user.",
 )
 async def login_api(
+    request: Request,
     user_data: UserLogin,
     db: Annotated[AsyncSession, Depends(get_db_session)],
 ):
-    user = await get_user_by_email(db, user_data.email)
-    if not user:
-        raise NotFoundException(detail="User not found")
-    if user.is_active is False:
-        raise BadRedquestException(detail="User account is not active")
-    if not verify_password(user_data.password, user.password):
-        raise UnauthorizedException(detail="Invalid credentials")
-    access_token = create_access_token(user)
+    # Throttled before queueing, so a flood from one client or against one account never reaches bcrypt.
+    login_ip_throttle.check(request.client.host if request.client else None)
+    login_email_throttle.check(user_data.email.lower())
+    async with login_limiter:
+        user = await get_user_by_email(db, user_data.email)
+        if not user:
+            raise NotFoundException(detail="User not found")
+        if user.is_active is False:
+            raise BadRedquestException(detail="User account is not active")
+        if not await password_hasher.verify(user_data.password, user.password):
+            raise UnauthorizedException(detail="Invalid credentials")
+        if password_hasher.needs_rehash(user.password):
+            await rehash_user_password(db, user, user_data.password)
+        access_token = create_access_token(user)
     return Token(access_token=access_token)
@@ -0,0 +1,28 @@
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class ProfileArm(BaseModel):
+    path_prefix: str = Field(pattern=r"^/")
+    count: int = Field(default=1, ge=1, le=100)
+
+
+class ProfileSignRequest(BaseModel):
+    method: str
+    path: str = Field(pattern=r"^/")
+    expires_in: int = Field(default=300, ge=1, le=3600)
+
+
+class ProfileSignResponse(BaseModel):
+    header: str = "X-Profile"
+    value: str
+
+
+class ProfileResponse(BaseModel):
+    id: str
+    method: str
+    path: str
+    status_code: int
+    duration: float
+    created_at: float
+
+    model_config = ConfigDict(from_attributes=True)
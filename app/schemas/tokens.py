@@ -9,3 +9,7 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     id: int | None = None
     email: str | None = None
+    role_id: int | None = None
+    is_active: bool | None = None
+    ver: int | None = None
+    exp: int = 0
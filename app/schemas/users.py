@@ -1,4 +1,6 @@
-from pydantic import BaseModel, ConfigDict, EmailStr
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, EmailStr, model_validator
 
 
 class UserBase(BaseModel):
@@ -14,6 +16,10 @@ class UserUpdate(UserBase):
     password: str
 
 
+class UserRoleUpdate(BaseModel):
+    role_id: int
+
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -26,3 +32,53 @@ class UserResponse(UserBase):
     role_id: int
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class UserPrincipal(BaseModel):
+    id: int
+    email: str
+    role_id: int
+    is_active: bool
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
+class UserBulkCreateResult(BaseModel):
+    email: EmailStr
+    status: Literal["created", "duplicate"]
+    user: UserResponse | None = None
+
+
+class UserBulkCreateResponse(BaseModel):
+    created: int
+    duplicates: int
+    results: list[UserBulkCreateResult]
+
+
+class UserBulkStatusUpdate(BaseModel):
+    ids: list[int] | None = None
+    role_id: int | None = None
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if self.ids is None and self.role_id is None:
+            raise ValueError("Either ids or role_id is required")
+        return self
+
+
+class UserBulkStatusResponse(BaseModel):
+    updated: int
+    missing_ids: list[int]
+
+
+class RoleStats(BaseModel):
+    role_id: int
+    total: int
+    active: int
+
+
+class UserStatsResponse(BaseModel):
+    total: int
+    active: int
+    inactive: int
+    roles: list[RoleStats]
@@ -1,19 +1,23 @@
 import asyncio
+import contextlib
 import json
 
 import pytest
 from fastapi.testclient import TestClient
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.core.admission import login_email_throttle, login_ip_throttle
 from app.core.database import DATABASE_URI, Base
 from app.core.hashing import get_password_hash
 from app.main import app
 from app.models.roles import Role
 from app.models.users import User
-from app.utils.users import create_access_token
+from app.utils.search import user_search
+from app.utils.users import create_access_token, principal_cache, token_cache, token_versions
 
 roles_fixtures_file_path = "/code/app/fixtures/roles.json"
 with open(roles_fixtures_file_path) as f:
@@ -36,6 +40,11 @@ def anyio_backend():
 async def db_engine():
     engine = create_async_engine(DATABASE_URI)
 
+    # User search uses pg_trgm where the server ships it, and its prefix index fallback otherwise.
+    with contextlib.suppress(DBAPIError):
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
@@ -63,10 +72,19 @@ async def db_session(db_engine):
         yield session
         await session.rollback()
         for table in reversed(Base.metadata.sorted_tables):
-            await session.execute(text(f"TRUNCATE {table.name} CASCADE;"))
+            await session.execute(text(f"TRUNCATE {table.name} RESTART IDENTITY CASCADE;"))
             await session.commit()
 
 
+@pytest.fixture(scope="function", autouse=True)
+def clear_caches():
+    for cache in (principal_cache, token_cache, token_versions, login_email_throttle, login_ip_throttle, user_search):
+        cache.clear()
+    yield
+    for cache in (principal_cache, token_cache, token_versions, login_email_throttle, login_ip_throttle, user_search):
+        cache.clear()
+
+
 @pytest.fixture(scope="function")
 async def client():
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test/api") as ac:
@@ -104,15 +122,17 @@ async def load_roles(db_session: AsyncSession):
 
 @pytest.fixture(scope="function")
 async def create_test_users(db_session: AsyncSession):
-    async def _create_test_users(count: int = 3, is_active: bool = True):
+    async def _create_test_users(count: int = 3, is_active: bool = True, role_id: int = 4, prefix: str | None = None):
         users = []
-        prefix = "" if is_active else "inactive_"
+        if prefix is None:
+            prefix = "" if is_active else "inactive_"
         for i in range(count):
             user = User(
                 username=f"testuser{i}",
                 email=f"{prefix}testuser{i}@example.com",
                 password=get_password_hash(f"password{i}"),
                 is_active=is_active,
+                role_id=role_id,
             )
             db_session.add(user)
             users.append(user)
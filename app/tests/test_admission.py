@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.admission import ConcurrencyLimiter, TokenBucket, login_email_throttle
+from app.utils.exceptions import ServiceUnavailableException, TooManyRequestsException
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limiter_sheds_when_queue_is_full():
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, timeout=5, retry_after=3)
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter:
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert limiter.in_flight == 1
+    assert limiter.waiting == 1
+    with pytest.raises(ServiceUnavailableException) as exc_info:
+        async with limiter:
+            pass
+    assert exc_info.value.headers == {"Retry-After": "3"}
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert limiter.in_flight == 0
+    assert limiter.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limiter_sheds_after_queue_timeout():
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=10, timeout=0.01)
+    async with limiter:
+        with pytest.raises(ServiceUnavailableException):
+            async with limiter:
+                pass
+    assert limiter.waiting == 0
+
+
+def test_token_bucket():
+    bucket = TokenBucket("test", rate=1, burst=2, max_keys=2)
+    assert bucket.take("a") == 0
+    assert bucket.take("a") == 0
+    assert 0 < bucket.take("a") <= 1
+    with pytest.raises(TooManyRequestsException):
+        bucket.check("a")
+    assert bucket.take("b") == 0
+    bucket.take("c")
+    # "a" was the least recently seen key, so it was dropped and starts over.
+    assert bucket.take("a") == 0
+
+
+@pytest.mark.asyncio
+async def test_login_is_throttled_per_email(client: AsyncClient, create_test_users):
+    await create_test_users(count=1)
+    credentials = {"email": "testuser0@example.com", "password": "wrongpassword"}
+    for _ in range(login_email_throttle.burst):
+        response = await client.post("/users/login", json=credentials)
+        assert response.status_code == 401
+    response = await client.post("/users/login", json={**credentials, "email": "TestUser0@example.com"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
@@ -0,0 +1,34 @@
+import pytest
+
+from app.benchmarks.harness import compare, percentile
+from app.benchmarks.serialization import run_benchmarks as run_serialization_benchmarks
+from app.benchmarks.users import WORKLOADS, run_benchmarks
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 95) == 0
+
+
+def test_compare():
+    baseline = {"workloads": {"get": {"p95_ms": 10.0, "throughput_rps": 100.0}}}
+    current = {"workloads": {"get": {"p95_ms": 12.0, "throughput_rps": 80.0}, "list": {}}}
+    assert len(compare(baseline, current, tolerance=0.1)) == 2
+    assert compare(baseline, current, tolerance=0.5) == []
+
+
+@pytest.mark.asyncio
+async def test_run_benchmarks_sqlite():
+    report = await run_benchmarks("sqlite", requests=5, concurrency=2, warmup=1, users=10, hash_rounds=4)
+    assert list(report["workloads"]) == list(WORKLOADS)
+    for result in report["workloads"].values():
+        assert result["errors"] == 0
+        assert result["requests"] == 5
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+
+
+def test_serialization_benchmark():
+    report = run_serialization_benchmarks(page_sizes=(1, 10), min_time=0.01)
+    assert set(report["results"]) == {"list-1", "list-10", "get"}
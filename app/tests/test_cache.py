@@ -0,0 +1,29 @@
+from prometheus_client import REGISTRY
+
+from app.core.cache import TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache("test_lru", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.evictions == 1
+    assert REGISTRY.get_sample_value("cache_requests_total", {"cache": "test_lru", "result": "hit"}) == 3
+    assert REGISTRY.get_sample_value("cache_requests_total", {"cache": "test_lru", "result": "miss"}) == 1
+    assert REGISTRY.get_sample_value("cache_removals_total", {"cache": "test_lru", "reason": "eviction"}) == 1
+    assert REGISTRY.get_sample_value("cache_entries", {"cache": "test_lru"}) == 2
+
+
+def test_ttl_cache_expires_entries(mocker):
+    now = mocker.patch("app.core.cache.time.monotonic", return_value=100.0)
+    cache = TTLCache("test_ttl", maxsize=2, ttl=10)
+    cache.set("a", 1)
+    now.return_value = 110.0
+    assert cache.get("a") is None
+    assert cache.stats.expirations == 1
+    assert len(cache) == 0
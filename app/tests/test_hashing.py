@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core.hashing import PasswordHasher, get_password_hash
+from app.utils.exceptions import ServiceUnavailableException
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_roundtrip():
+    hasher = PasswordHasher(max_workers=2, max_queue=2)
+    hashed = await hasher.hash("password")
+    assert await hasher.verify("password", hashed) is True
+    assert await hasher.verify("wrongpassword", hashed) is False
+    assert hasher.metrics.completed == 3
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+    rejected = REGISTRY.get_sample_value("password_hash_rejected_total")
+    hashed = REGISTRY.get_sample_value("password_hash_duration_seconds_count")
+    results = await asyncio.gather(*(hasher.hash("password") for _ in range(3)), return_exceptions=True)
+    rejections = [result for result in results if isinstance(result, ServiceUnavailableException)]
+    assert len(rejections) == 1
+    assert rejections[0].headers == {"Retry-After": "1"}
+    assert hasher.metrics.rejected == 1
+    assert REGISTRY.get_sample_value("password_hash_rejected_total") - rejected == 1
+    assert REGISTRY.get_sample_value("password_hash_duration_seconds_count") - hashed == 2
+    assert REGISTRY.get_sample_value("password_hash_in_flight") == 0
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_calibration_respects_bounds():
+    hasher = PasswordHasher()
+    assert await hasher.calibrate(target_ms=0, min_rounds=4, max_rounds=6) == 4
+    assert list(hasher.calibration) == [4]
+    assert await hasher.calibrate(target_ms=60_000, min_rounds=4, max_rounds=6) == 6
+    assert list(hasher.calibration) == [4, 5, 6]
+    assert hasher.needs_rehash(get_password_hash("password", rounds=4)) is True
+    assert hasher.needs_rehash(get_password_hash("password", rounds=6)) is False
+    assert hasher.needs_rehash(get_password_hash("password", rounds=7)) is False
+    assert REGISTRY.get_sample_value("password_hash_rounds") == 6
+    assert REGISTRY.get_sample_value("password_hash_calibration_seconds", {"rounds": "5"}) == hasher.calibration[5]
+    hasher.shutdown()
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import func, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models.users import User
+from app.utils.users import USER_RESPONSE_COLUMNS, filter_users
+
+
+async def explain(db: AsyncSession, stmt) -> str:
+    sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    # The test table is tiny, so rule out sequential scans to see which index the planner can use.
+    await db.execute(text("SET LOCAL enable_seqscan = off"))
+    result = await db.execute(text(f"EXPLAIN {sql}"))
+    return "\n".join(row[0] for row in result)
+
+
+@pytest.mark.asyncio
+async def test_email_lookup_uses_lower_email_index(db_session: AsyncSession):
+    # Same lookup as get_user_by_email.
+    plan = await explain(db_session, select(User).where(func.lower(User.email) == "foo@example.com"))
+    assert "ix_users_email_lower" in plan, plan
+
+
+@pytest.mark.asyncio
+async def test_filtered_listing_uses_composite_index(db_session: AsyncSession):
+    stmt = filter_users(select(*USER_RESPONSE_COLUMNS), is_active=True, role_id=4).order_by(User.id).limit(100)
+    plan = await explain(db_session, stmt)
+    assert "ix_users_role_id_is_active_id" in plan, plan
+
+
+@pytest.mark.asyncio
+async def test_inactive_listing_uses_partial_index(db_session: AsyncSession):
+    stmt = filter_users(select(*USER_RESPONSE_COLUMNS), is_active=False).order_by(User.id).limit(100)
+    plan = await explain(db_session, stmt)
+    assert "ix_users_inactive" in plan, plan
@@ -0,0 +1,24 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=1)
+    response = await auth_client.get(f"/users/{users[0].id}")
+    assert response.status_code == 200, response.json()
+    phases = {metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")}
+    assert {"auth", "db", "serialization", "total"} <= phases
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(auth_client: AsyncClient):
+    await auth_client.get("/users/")
+    response = await auth_client.get("http://test/metrics")
+    assert response.status_code == 200
+    assert 'http_requests_total{method="GET",route="/api/users/",status="200"}' in response.text
+    assert "http_request_duration_seconds_bucket" in response.text
+    assert 'http_requests_in_progress{method="GET",route="/api/users/"}' in response.text
+    assert 'cache_requests_total{cache="principal",result="miss"}' in response.text
+    assert 'cache_entries{cache="token"}' in response.text
+    assert 'db_pool_checkout_wait_seconds_count{engine="primary"}' in response.text
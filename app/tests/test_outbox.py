@@ -0,0 +1,36 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.outbox import OutboxEvent
+from app.utils.outbox import USER_REGISTERED, USERS_REGISTERED, add_event, outbox_relay
+
+
+@pytest.mark.asyncio
+@patch("app.worker.tasks.users.post_registration_batch.delay", side_effect=ConnectionError("broker down"))
+async def test_failed_publish_is_retried_later(mocked_post_registration, db_session: AsyncSession):
+    add_event(db_session, USER_REGISTERED, {"user_id": 1})
+    await db_session.commit()
+
+    assert await outbox_relay.drain_once() == 1
+    assert await outbox_relay.drain_once() == 0
+    mocked_post_registration.assert_called_once_with([1])
+
+    event = (await db_session.execute(select(OutboxEvent).execution_options(populate_existing=True))).scalar_one()
+    assert event.attempts == 1
+    assert "broker down" in event.last_error
+
+
+@pytest.mark.asyncio
+@patch("app.worker.tasks.users.post_registration_batch.delay")
+async def test_registration_events_are_published_as_one_batch(mocked_post_registration_batch, db_session: AsyncSession):
+    add_event(db_session, USER_REGISTERED, {"user_id": 1})
+    add_event(db_session, USER_REGISTERED, {"user_id": 2})
+    add_event(db_session, USERS_REGISTERED, {"user_ids": [3, 4]})
+    await db_session.commit()
+
+    assert await outbox_relay.drain_once() == 3
+    mocked_post_registration_batch.assert_called_once_with([1, 2, 3, 4])
+    assert (await db_session.execute(select(OutboxEvent))).first() is None
@@ -0,0 +1,55 @@
+import pytest
+from httpx import AsyncClient
+
+from app.core.profiling import request_profiler
+
+
+@pytest.fixture(autouse=True)
+def clear_profiles():
+    request_profiler.profiles.clear()
+    request_profiler.armed.clear()
+
+
+@pytest.mark.asyncio
+async def test_armed_profile(auth_client: AsyncClient):
+    response = await auth_client.post("/profiles/arm", json={"path_prefix": "/api/users", "count": 1})
+    assert response.status_code == 204
+    await auth_client.get("/users/")
+    await auth_client.get("/users/")
+
+    response = await auth_client.get("/profiles/")
+    assert response.status_code == 200
+    profiles = response.json()
+    assert len(profiles) == 1
+    assert profiles[0]["path"] == "/api/users/"
+    assert profiles[0]["status_code"] == 200
+
+    response = await auth_client.get(f"/profiles/{profiles[0]['id']}")
+    assert response.status_code == 200
+    assert "speedscope" in response.json()["$schema"]
+    response = await auth_client.get(f"/profiles/{profiles[0]['id']}", params={"format": "html"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+
+
+@pytest.mark.asyncio
+async def test_signed_profile_header(auth_client: AsyncClient):
+    response = await auth_client.post("/profiles/sign", json={"method": "GET", "path": "/api/users/"})
+    assert response.status_code == 200
+    signature = response.json()
+
+    await auth_client.get("/users/", headers={signature["header"]: "0.invalid"})
+    assert len(request_profiler.profiles) == 0
+    await auth_client.get("/users/", headers={signature["header"]: signature["value"]})
+    assert len(request_profiler.profiles) == 1
+    # The signature is bound to the method and path.
+    await auth_client.get("/roles/", headers={signature["header"]: signature["value"]})
+    assert len(request_profiler.profiles) == 1
+
+
+@pytest.mark.asyncio
+async def test_profiles_require_admin(client: AsyncClient):
+    response = await client.get("/profiles/")
+    assert response.status_code == 403
+    response = await client.get("/profiles/unknown")
+    assert response.status_code == 403
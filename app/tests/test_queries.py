@@ -0,0 +1,68 @@
+import logging
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+
+from app.core import queries
+from app.core.database import db_session
+from app.core.queries import finish_query_stats, start_query_stats
+from app.models.users import User
+
+
+@pytest.mark.asyncio
+async def test_request_query_count_in_server_timing(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=1)
+    response = await auth_client.get(f"/users/{users[0].id}")
+    assert "db;dur=" in response.headers["server-timing"]
+    assert 'desc="2 queries"' in response.headers["server-timing"]
+
+
+@pytest.mark.asyncio
+async def test_slow_query_is_logged_with_plan(auth_client: AsyncClient, monkeypatch, caplog):
+    monkeypatch.setattr(queries.config, "SLOW_QUERY_THRESHOLD_MS", 0)
+    monkeypatch.setattr(queries.config, "SLOW_QUERY_EXPLAIN", True)
+    with caplog.at_level(logging.WARNING, logger="app.core.queries"):
+        response = await auth_client.get("/users/", params={"role_id": 1})
+    assert response.status_code == 200, response.json()
+    slow = [record for record in caplog.records if record.getMessage().startswith("Slow query")]
+    assert slow
+    assert all("admin@gmail.com" not in str(record.parameters) for record in slow)
+    assert any(record.plan and "Scan" in record.plan for record in slow)
+    assert any("FROM users" in record.getMessage() and "Plan:" in record.getMessage() for record in slow)
+    assert all("admin@gmail.com" not in record.getMessage() for record in slow)
+
+
+@pytest.mark.asyncio
+async def test_failing_explain_does_not_abort_the_request(auth_client: AsyncClient, monkeypatch, caplog):
+    exec_driver_sql = Connection.exec_driver_sql
+
+    def broken_explain(self, statement, parameters=None, execution_options=None):
+        if statement.startswith("EXPLAIN"):
+            statement = "EXPLAIN SELECT * FROM missing_table"
+        return exec_driver_sql(self, statement, parameters, execution_options)
+
+    monkeypatch.setattr(Connection, "exec_driver_sql", broken_explain)
+    monkeypatch.setattr(queries.config, "SLOW_QUERY_THRESHOLD_MS", 0)
+    monkeypatch.setattr(queries.config, "SLOW_QUERY_EXPLAIN", True)
+    with caplog.at_level(logging.WARNING, logger="app.core.queries"):
+        response = await auth_client.get("/users/", params={"role_id": 1})
+    assert response.status_code == 200, response.json()
+    slow = [record for record in caplog.records if record.getMessage().startswith("Slow query")]
+    assert slow
+    assert all(record.plan is None for record in slow)
+
+
+@pytest.mark.asyncio
+async def test_repeated_statement_is_reported(monkeypatch, caplog):
+    monkeypatch.setattr(queries.config, "N_PLUS_ONE_THRESHOLD", 3)
+    stats = start_query_stats()
+    async with db_session() as session:
+        for user_id in range(3):
+            await session.execute(select(User).where(User.id == user_id))
+    assert stats.count == 3
+    with caplog.at_level(logging.WARNING, logger="app.core.queries"):
+        finish_query_stats(stats, "test")
+    assert "Possible N+1" in caplog.text
+    assert "FROM users" in caplog.text
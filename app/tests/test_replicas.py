@@ -0,0 +1,67 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import exc
+
+from app.core.database import DATABASE_URI
+from app.core.replicas import READ_PRIMARY_COOKIE, ReplicaRouter, create_replica, is_connection_error, replica_router
+
+
+@pytest.fixture
+async def replicas(monkeypatch):
+    # Both "replicas" point at the test database, which is enough to check the routing.
+    replicas = [create_replica(DATABASE_URI), create_replica(DATABASE_URI)]
+    opened = {replica.name + str(i): 0 for i, replica in enumerate(replicas)}
+    for i, replica in enumerate(replicas):
+        factory = replica.session_factory
+
+        def counting_factory(factory=factory, key=replica.name + str(i)):
+            opened[key] += 1
+            return factory()
+
+        replica.session_factory = counting_factory
+    monkeypatch.setattr(replica_router, "replicas", replicas)
+    yield opened
+    for replica in replicas:
+        await replica.engine.dispose()
+
+
+def test_round_robin_and_ejection():
+    replicas = [create_replica(DATABASE_URI), create_replica(DATABASE_URI)]
+    router = ReplicaRouter(replicas, strategy="round_robin", max_failures=2, eject_seconds=60)
+    assert {router.choose() is replicas[0] for _ in range(2)} == {True, False}
+
+    router.record_failure(replicas[0])
+    router.record_success(replicas[0])
+    router.record_failure(replicas[0])
+    assert replicas[0].is_available(0)
+    router.record_failure(replicas[0])
+    assert all(router.choose() is replicas[1] for _ in range(3))
+    router.record_failure(replicas[1])
+    router.record_failure(replicas[1])
+    assert router.choose() is None
+
+
+def test_is_connection_error():
+    assert is_connection_error(ConnectionRefusedError())
+    assert is_connection_error(exc.OperationalError("SELECT 1", {}, Exception()))
+    assert not is_connection_error(exc.IntegrityError("INSERT", {}, Exception()))
+    assert not is_connection_error(ValueError())
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replicas_until_the_client_writes(auth_client: AsyncClient, create_test_users, replicas):
+    users = await create_test_users(count=1)
+    response = await auth_client.get("/users/")
+    assert response.status_code == 200
+    response = await auth_client.get(f"/users/{users[0].id}")
+    assert response.status_code == 200
+    assert sum(replicas.values()) == 2
+    assert all(count == 1 for count in replicas.values())
+
+    response = await auth_client.put(f"/users/deactivate/{users[0].id}")
+    assert response.status_code == 200
+    assert READ_PRIMARY_COOKIE in response.cookies
+    response = await auth_client.get(f"/users/{users[0].id}")
+    assert response.json()["is_active"] is False
+    # The write and its auth lookup ran on the primary, and so did the read that followed it.
+    assert sum(replicas.values()) == 2
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.models.roles import Role, RolePrivilege
+from app.utils.roles import RoleRegistry, role_registry
+
+
+def test_registry_defaults_to_role_privileges():
+    registry = RoleRegistry()
+    assert registry.get(RolePrivilege.ADMIN).name == "Admin"
+    assert registry.mask(RolePrivilege.EDITOR) == 1 << RolePrivilege.EDITOR
+    assert registry.mask(999) == 0
+
+
+@pytest.mark.asyncio
+async def test_refresh_roles(auth_client: AsyncClient):
+    response = await auth_client.post("/roles/refresh")
+    assert response.status_code == 200, response.json()
+    assert len(response.json()) == 5
+    assert role_registry.get(RolePrivilege.ADMIN).description.startswith("Full control")
+
+    response = await auth_client.get("/roles/")
+    assert response.status_code == 200, response.json()
+    assert response.json()[0]["name"] == "Admin"
+
+
+@pytest.mark.asyncio
+async def test_registry_reloads_periodically(db_engine, db_session: AsyncSession):
+    registry = RoleRegistry()
+    registry.start_reloading(sessionmaker(bind=db_engine, class_=AsyncSession), interval=0.05)
+    await db_session.execute(update(Role).where(Role.id == RolePrivilege.SUPPORT).values(name="Helpdesk"))
+    await db_session.commit()
+    for _ in range(50):
+        if registry.get(RolePrivilege.SUPPORT).name == "Helpdesk":
+            break
+        await asyncio.sleep(0.05)
+    await registry.stop_reloading()
+    assert registry.get(RolePrivilege.SUPPORT).name == "Helpdesk"
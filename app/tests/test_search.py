@@ -0,0 +1,44 @@
+import pytest
+from httpx import AsyncClient
+
+from app.models.roles import RolePrivilege
+from app.utils.search import PrefixIndex
+from app.utils.users import create_access_token
+
+
+def test_prefix_index():
+    index = PrefixIndex([(1, "alice", "alice@example.com"), (2, "alicia", "al@example.com"), (3, "bob", "ali@x.io")])
+    assert index.search("ali", 10) == [1, 2, 3]
+    assert index.search("ALICE", 10) == [1]
+    assert index.search("ali", 2) == [1, 2]
+    assert index.search("al@", 10) == [2]
+    assert index.search("carol", 10) == []
+
+
+@pytest.mark.asyncio
+async def test_search_users(auth_client: AsyncClient, create_test_users):
+    await create_test_users(count=12)
+    response = await auth_client.get("/users/search", params={"q": "testuser1"})
+    assert response.status_code == 200, response.json()
+    results = response.json()
+    assert results[0]["username"] == "testuser1"
+    assert {user["username"] for user in results} == {"testuser1", "testuser10", "testuser11"}
+    assert set(results[0]) == {"id", "username", "email", "is_active", "role_id"}
+
+    response = await auth_client.get("/users/search", params={"q": "testuser", "limit": 5})
+    assert len(response.json()) == 5
+    response = await auth_client.get("/users/search", params={"q": "nobody"})
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_search_users_validation_and_access(auth_client: AsyncClient, create_test_users):
+    response = await auth_client.get("/users/search", params={"q": "ab"})
+    assert response.status_code == 422
+    response = await auth_client.get("/users/search", params={"q": "abc", "limit": 1000})
+    assert response.status_code == 422
+
+    viewer = (await create_test_users(count=1, role_id=RolePrivilege.VIEWER))[0]
+    auth_client.headers.update({"Authorization": f"Bearer {create_access_token(viewer)}"})
+    response = await auth_client.get("/users/search", params={"q": "testuser"})
+    assert response.status_code == 403
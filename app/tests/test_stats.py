@@ -0,0 +1,67 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import db_session
+from app.models.roles import RolePrivilege
+from app.utils.stats import get_user_stats, reconcile_stats
+from app.utils.users import _set_user_status, get_user_by_id, set_users_status
+
+
+def role_counts(stats: dict) -> dict:
+    return {role["role_id"]: (role["total"], role["active"]) for role in stats["roles"]}
+
+
+@pytest.mark.asyncio
+@patch("app.worker.tasks.users.post_registration_batch.delay")
+async def test_user_stats_follow_changes(mocked_post_registration_batch, auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=3, is_active=False)
+    # Fixtures insert users directly, so the counters start out of date and are reconciled first.
+    drift = await reconcile_stats(db_session, chunk_size=2)
+    assert drift.rows() == [
+        {"role_id": RolePrivilege.ADMIN, "total": 1, "active": 1},
+        {"role_id": RolePrivilege.VIEWER, "total": 3, "active": 0},
+    ]
+    response = await auth_client.get("/users/stats")
+    assert response.status_code == 200, response.json()
+    assert response.json()["total"] == 4
+    assert response.json()["active"] == 1
+
+    await auth_client.post("/users/", json={"username": "new", "email": "new@example.com", "password": "password"})
+    await auth_client.put(f"/users/activate/{users[0].id}")
+    await auth_client.put(f"/users/activate/{users[0].id}")
+    await auth_client.put("/users/activate", json={"ids": [users[0].id, users[1].id]})
+    await auth_client.put(f"/users/role/{users[1].id}", json={"role_id": RolePrivilege.EDITOR})
+    await auth_client.put(f"/users/role/{users[2].id}", json={"role_id": 999})
+
+    stats = (await auth_client.get("/users/stats")).json()
+    assert (stats["total"], stats["active"], stats["inactive"]) == (5, 3, 2)
+    assert role_counts(stats) == {
+        RolePrivilege.ADMIN: (1, 1),
+        RolePrivilege.EDITOR: (1, 1),
+        RolePrivilege.VIEWER: (3, 1),
+    }
+    assert not await reconcile_stats(db_session)
+
+
+@pytest.mark.asyncio
+async def test_single_and_bulk_status_changes_do_not_deadlock(create_test_users, db_engine):
+    users = await create_test_users(count=2, is_active=False)
+    session_factory = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as single, session_factory() as bulk:
+        user = await get_user_by_id(single, users[0].id)
+        await _set_user_status(single, user, True)
+        # The bulk update starts while the single change holds its locks, and waits for them.
+        task = asyncio.create_task(set_users_status(bulk, True, ids=[user.id for user in users]))
+        await asyncio.sleep(0.2)
+        await single.commit()
+        result = await asyncio.wait_for(task, timeout=10)
+    assert result.updated == 2
+
+    async with session_factory() as session:
+        stats = await get_user_stats(session)
+    assert role_counts(stats.model_dump())[RolePrivilege.VIEWER] == (0, 2)
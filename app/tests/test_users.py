@@ -1,14 +1,41 @@
+import asyncio
+import csv
+import io
+import json
 import random
 import string
 from unittest.mock import patch
 
+import jwt
 import pytest
+from fastapi import Request
 from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
 from starlette import status
 
+from app.core.database import engine, pool_status
+from app.core.hashing import get_hash_rounds, get_password_hash, password_hasher
+from app.models.roles import RolePrivilege
+from app.routers.users import export_users_api
+from app.schemas.users import UserUpdate
+from app.utils.exceptions import ConflictException, PreconditionFailedException
+from app.utils.outbox import outbox_relay
+from app.utils.users import (
+    activate_user,
+    create_access_token,
+    deactivate_user,
+    get_user_by_id,
+    principal_cache,
+    token_cache,
+    update_user,
+    update_user_role,
+)
+from app.utils.users import config as auth_config
+
 
 @pytest.mark.asyncio
-@patch("app.worker.tasks.users.post_registration.delay")
+@patch("app.worker.tasks.users.post_registration_batch.delay")
 async def test_create_user(mocked_post_registration, client: AsyncClient) -> None:
     user_data = {
         "username": "Momo",
@@ -25,7 +52,11 @@ async def test_create_user(mocked_post_registration, client: AsyncClient) -> Non
         "is_active": False,
         "role_id": 4,
     }  # noqa: E501
-    mocked_post_registration.assert_called_once()
+    mocked_post_registration.assert_not_called()
+
+    assert await outbox_relay.drain_once() == 1
+    mocked_post_registration.assert_called_once_with([1])
+    assert await outbox_relay.drain_once() == 0
 
 
 @pytest.mark.asyncio
@@ -107,3 +138,345 @@ async def test_deactivate_user_account(auth_client: AsyncClient, create_test_use
     response = await auth_client.put(f"/users/deactivate/{users[0].id}")
     assert response.status_code == 200, response.json()
     assert response.json()["is_active"] is False
+
+
+@pytest.mark.asyncio
+async def test_update_user(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=1)
+    editor = (await create_test_users(count=1, is_active=True, role_id=RolePrivilege.EDITOR, prefix="editor_"))[0]
+    auth_client.headers.update({"Authorization": f"Bearer {create_access_token(editor)}"})
+    response = await auth_client.put(f"/users/{users[0].id}", json={"username": "renamed", "password": "newpassword"})
+    assert response.status_code == 200, response.json()
+    assert response.json()["username"] == "renamed"
+
+    response = await auth_client.post("/users/login", json={"email": users[0].email, "password": "newpassword"})
+    assert response.status_code == 200, response.json()
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_stale_password_hash(client: AsyncClient, create_test_users, db_session, monkeypatch):
+    users = await create_test_users(count=1)
+    users[0].password = get_password_hash("password0", rounds=4)
+    await db_session.commit()
+    monkeypatch.setattr(password_hasher, "rounds", 5)
+    response = await client.post("/users/login", json={"email": users[0].email, "password": "password0"})
+    assert response.status_code == 200, response.json()
+
+    await db_session.refresh(users[0])
+    assert get_hash_rounds(users[0].password) == 5
+
+
+@pytest.mark.asyncio
+async def test_concurrent_logins_both_rehash(client: AsyncClient, create_test_users, db_session, monkeypatch):
+    users = await create_test_users(count=1)
+    users[0].password = get_password_hash("password0", rounds=4)
+    await db_session.commit()
+    monkeypatch.setattr(password_hasher, "rounds", 5)
+    responses = await asyncio.gather(
+        *(client.post("/users/login", json={"email": users[0].email, "password": "password0"}) for _ in range(2))
+    )
+    assert [response.status_code for response in responses] == [200, 200]
+
+    await db_session.refresh(users[0])
+    assert get_hash_rounds(users[0].password) == 5
+
+
+@pytest.mark.asyncio
+async def test_concurrent_status_changes_conflict(create_test_users, db_engine):
+    users = await create_test_users(count=1, is_active=False)
+    session_factory = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as first, session_factory() as second, session_factory() as third:
+        first_user = await get_user_by_id(first, users[0].id)
+        second_user = await get_user_by_id(second, users[0].id)
+        third_user = await get_user_by_id(third, users[0].id)
+        await activate_user(first, first_user)
+        with pytest.raises(ConflictException):
+            await deactivate_user(second, second_user)
+        with pytest.raises(ConflictException):
+            await update_user_role(third, third_user, RolePrivilege.EDITOR)
+        await second.refresh(second_user)
+        assert second_user.is_active is True
+        assert second_user.role_id == 4
+
+
+@pytest.mark.asyncio
+async def test_concurrent_updates_conflict(create_test_users, db_engine):
+    users = await create_test_users(count=1)
+    data = UserUpdate(username="renamed", password="newpassword")
+    session_factory = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as first, session_factory() as second, session_factory() as third:
+        first_user = await get_user_by_id(first, users[0].id)
+        second_user = await get_user_by_id(second, users[0].id)
+        third_user = await get_user_by_id(third, users[0].id)
+        await update_user(first, first_user, data)
+        with pytest.raises(ConflictException):
+            await update_user(second, second_user, data)
+        with pytest.raises(PreconditionFailedException):
+            await update_user(third, third_user, data, conditional=True)
+
+
+@pytest.mark.asyncio
+async def test_login_never_downgrades_password_hash(client: AsyncClient, create_test_users, db_session, monkeypatch):
+    users = await create_test_users(count=1)
+    monkeypatch.setattr(password_hasher, "rounds", 4)
+    response = await client.post("/users/login", json={"email": users[0].email, "password": "password0"})
+    assert response.status_code == 200, response.json()
+
+    await db_session.refresh(users[0])
+    assert get_hash_rounds(users[0].password) == 12
+
+
+@pytest.mark.asyncio
+async def test_principal_cache_is_invalidated_on_status_change(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=1)
+    hits = principal_cache.stats.hits
+    await auth_client.get(f"/users/{users[0].id}")
+    await auth_client.get(f"/users/{users[0].id}")
+    assert principal_cache.stats.hits - hits == 1
+    assert principal_cache.get("admin@gmail.com") is not None
+
+    admin_id = principal_cache.get("admin@gmail.com").id
+    response = await auth_client.put(f"/users/deactivate/{admin_id}")
+    assert response.status_code == 200, response.json()
+    assert principal_cache.get("admin@gmail.com") is None
+
+
+@pytest.mark.asyncio
+async def test_verified_token_is_cached(auth_client: AsyncClient, create_test_users, mocker):
+    users = await create_test_users(count=1)
+    decode = mocker.spy(jwt, "decode")
+    hits = token_cache.stats.hits
+    for _ in range(3):
+        response = await auth_client.get(f"/users/{users[0].id}")
+        assert response.status_code == 200, response.json()
+    assert decode.call_count == 1
+    assert token_cache.stats.hits - hits == 2
+
+
+@pytest.mark.asyncio
+async def test_invalid_token_is_rejected(client: AsyncClient):
+    client.headers.update({"Authorization": "Bearer not-a-token"})
+    response = await client.get("/users/")
+    assert response.status_code == 401, response.json()
+    assert len(token_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_claims_mode_authorizes_from_token(auth_client: AsyncClient, create_test_users, monkeypatch):
+    monkeypatch.setattr(auth_config, "AUTH_MODE", "claims")
+    users = await create_test_users(count=1, role_id=RolePrivilege.ADMIN, prefix="admin_")
+    token = create_access_token(users[0])
+    response = await auth_client.get("/users/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.json()
+    assert principal_cache.get(users[0].email) is None
+
+    response = await auth_client.put(f"/users/deactivate/{users[0].id}")
+    assert response.status_code == 200, response.json()
+    response = await auth_client.get("/users/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401, response.json()
+
+
+@pytest.mark.asyncio
+async def test_change_user_role(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=1)
+    response = await auth_client.put(f"/users/role/{users[0].id}", json={"role_id": RolePrivilege.EDITOR})
+    assert response.status_code == 200, response.json()
+    assert response.json()["role_id"] == RolePrivilege.EDITOR
+
+    response = await auth_client.put(f"/users/role/{users[0].id}", json={"role_id": 999})
+    assert response.status_code == 400, response.json()
+
+
+@pytest.mark.asyncio
+async def test_list_users_pagination(auth_client: AsyncClient, create_test_users):
+    await create_test_users(count=4)
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = await auth_client.get("/users/", params=params)
+        assert response.status_code == 200, response.json()
+        seen.extend(user["id"] for user in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["after"] = response.headers["X-Next-Cursor"]
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+
+@pytest.mark.asyncio
+async def test_list_users_filters(auth_client: AsyncClient, create_test_users):
+    await create_test_users(count=2)
+    await create_test_users(count=3, is_active=False)
+    response = await auth_client.get("/users/", params={"is_active": False})
+    assert len(response.json()) == 3
+    response = await auth_client.get("/users/", params={"is_active": True, "role_id": RolePrivilege.ADMIN})
+    assert [user["email"] for user in response.json()] == ["admin@gmail.com"]
+    response = await auth_client.get("/users/", params={"after": "garbage"})
+    assert response.status_code == 400, response.json()
+
+
+@pytest.mark.asyncio
+async def test_export_users_ndjson(auth_client: AsyncClient, create_test_users):
+    await create_test_users(count=3)
+    await create_test_users(count=2, is_active=False)
+    response = await auth_client.get("/users/export", params={"is_active": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert len(users) == 4
+    assert set(users[0]) == {"id", "username", "email", "is_active", "role_id"}
+
+
+@pytest.mark.asyncio
+async def test_export_releases_connection_on_disconnect(create_test_users):
+    await create_test_users(count=3)
+    response = await export_users_api(Request({"type": "http", "method": "GET", "headers": []}))
+    sent = asyncio.Event()
+
+    async def receive():
+        await sent.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            sent.set()
+            # The client is gone, so the body is never acknowledged.
+            await asyncio.Event().wait()
+
+    await response({"type": "http"}, receive, send)
+    assert response.body_iterator.ag_frame is None
+    assert pool_status(engine)["checked_out"] == 0
+
+
+@pytest.mark.asyncio
+async def test_export_users_csv(auth_client: AsyncClient, create_test_users):
+    await create_test_users(count=3)
+    response = await auth_client.get("/users/export", params={"format": "csv"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 4
+    assert rows[0]["email"] == "admin@gmail.com"
+
+
+@pytest.mark.asyncio
+@patch("app.worker.tasks.users.post_registration_batch.delay")
+async def test_create_users_in_bulk(mocked_post_registration_batch, auth_client: AsyncClient, create_test_users):
+    await create_test_users(count=1)
+    users = [
+        {"username": "new0", "email": "new0@example.com", "password": "password"},
+        {"username": "existing", "email": "testuser0@example.com", "password": "password"},
+        {"username": "new1", "email": "new1@example.com", "password": "password"},
+        {"username": "repeated", "email": "new0@example.com", "password": "password"},
+    ]
+    response = await auth_client.post("/users/bulk", json=users)
+    assert response.status_code == 200, response.json()
+    body = response.json()
+    assert (body["created"], body["duplicates"]) == (2, 2)
+    assert [result["status"] for result in body["results"]] == ["created", "duplicate", "created", "duplicate"]
+    assert body["results"][0]["user"]["username"] == "new0"
+    assert await outbox_relay.drain_once() == 1
+    mocked_post_registration_batch.assert_called_once()
+    assert len(mocked_post_registration_batch.call_args.args[0]) == 2
+
+
+@pytest.mark.asyncio
+async def test_activate_users_in_bulk(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=3, is_active=False)
+    ids = [user.id for user in users[:2]]
+    response = await auth_client.put("/users/activate", json={"ids": [*ids, 0]})
+    assert response.status_code == 200, response.json()
+    assert response.json() == {"updated": 2, "missing_ids": [0]}
+    response = await auth_client.get("/users/", params={"is_active": False})
+    assert [user["id"] for user in response.json()] == [users[2].id]
+
+
+@pytest.mark.asyncio
+async def test_deactivate_users_by_role(auth_client: AsyncClient, create_test_users):
+    await create_test_users(count=3)
+    response = await auth_client.put("/users/deactivate", json={"role_id": RolePrivilege.VIEWER})
+    assert response.status_code == 200, response.json()
+    assert response.json() == {"updated": 3, "missing_ids": []}
+    response = await auth_client.put("/users/deactivate", json={})
+    assert response.status_code == 422, response.json()
+
+
+@pytest.mark.asyncio
+async def test_get_user_response(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=1)
+    response = await auth_client.get(f"/users/{users[0].id}")
+    assert response.status_code == 200
+    assert response.json() == {
+        "id": users[0].id,
+        "username": "testuser0",
+        "email": "testuser0@example.com",
+        "is_active": True,
+        "role_id": 4,
+    }
+    response = await auth_client.get("/users/")
+    assert response.json()[1] == {
+        "id": users[0].id,
+        "username": "testuser0",
+        "email": "testuser0@example.com",
+        "is_active": True,
+        "role_id": 4,
+    }
+    response = await auth_client.get("/users/999999")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_user_conditional(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=1)
+    response = await auth_client.get(f"/users/{users[0].id}")
+    etag = response.headers["ETag"]
+    response = await auth_client.get(f"/users/{users[0].id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    await auth_client.put(f"/users/deactivate/{users[0].id}")
+    response = await auth_client.get(f"/users/{users[0].id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["is_active"] is False
+    response = await auth_client.get("/users/999999", headers={"If-None-Match": etag})
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_list_users_conditional(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=3)
+    response = await auth_client.get("/users/")
+    etag = response.headers["ETag"]
+    response = await auth_client.get("/users/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    await auth_client.put("/users/deactivate", json={"ids": [users[1].id]})
+    response = await auth_client.get("/users/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_update_user_if_match(auth_client: AsyncClient, create_test_users):
+    users = await create_test_users(count=1)
+    editor = (await create_test_users(count=1, is_active=True, role_id=RolePrivilege.EDITOR, prefix="editor_"))[0]
+    auth_client.headers.update({"Authorization": f"Bearer {create_access_token(editor)}"})
+    etag = (await auth_client.get(f"/users/{users[0].id}")).headers["ETag"]
+
+    data = {"username": "renamed", "password": "newpassword"}
+    response = await auth_client.put(f"/users/{users[0].id}", json=data, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    response = await auth_client.put(f"/users/{users[0].id}", json=data, headers={"If-Match": etag})
+    assert response.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_emails_are_case_insensitive(client: AsyncClient, create_test_users):
+    await create_test_users(count=1)
+    response = await client.post("/users/login", json={"email": "TestUser0@Example.com", "password": "password0"})
+    assert response.status_code == 200, response.json()
+    response = await client.post(
+        "/users/", json={"username": "dup", "email": "TESTUSER0@example.com", "password": "password"}
+    )
+    assert response.status_code == 400
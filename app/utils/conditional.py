@@ -0,0 +1,31 @@
+import hashlib
+from collections.abc import Iterable
+
+
+def make_etag(*parts: object) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def make_list_etag(versions: Iterable[tuple[int, int]], *parts: object) -> str:
+    digest = hashlib.sha256(repr((list(versions), parts)).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _parse(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def if_none_match(header: str | None, etag: str) -> bool:
+    """Returns True if the If-None-Match header matches `etag`, using weak comparison as RFC 9110 requires"""
+    if header is None:
+        return False
+    tags = _parse(header)
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def if_match(header: str | None, etag: str) -> bool:
+    """Returns True if the If-Match header is absent or matches `etag`, using strong comparison"""
+    if header is None:
+        return True
+    tags = _parse(header)
+    return "*" in tags or (not etag.startswith("W/") and etag in tags)
@@ -35,3 +35,39 @@ class BadRedquestException(HTTPException):
         headers: dict = None,
     ):
         super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail, headers=headers)
+
+
+class ConflictException(HTTPException):
+    def __init__(
+        self,
+        detail: str = "Conflict",
+        headers: dict = None,
+    ):
+        super().__init__(status_code=status.HTTP_409_CONFLICT, detail=detail, headers=headers)
+
+
+class PreconditionFailedException(HTTPException):
+    def __init__(
+        self,
+        detail: str = "Precondition failed",
+        headers: dict = None,
+    ):
+        super().__init__(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=detail, headers=headers)
+
+
+class ServiceUnavailableException(HTTPException):
+    def __init__(
+        self,
+        detail: str = "Service temporarily unavailable",
+        headers: dict = None,
+    ):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail, headers=headers)
+
+
+class TooManyRequestsException(HTTPException):
+    def __init__(
+        self,
+        detail: str = "Too many requests",
+        headers: dict = None,
+    ):
+        super().__init__(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=detail, headers=headers)
@@ -0,0 +1,179 @@
+import asyncio
+import contextlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+
+from pydantic_settings import BaseSettings
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import db_session
+from app.models.outbox import OutboxEvent
+from app.worker.tasks.users import post_registration, post_registration_batch
+
+USER_REGISTERED = "user.registered"
+USERS_REGISTERED = "users.registered"
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxSettings(BaseSettings):
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_RETRY_BACKOFF: float = 2.0
+    # Registration events drained together are published as one post_registration_batch task.
+    OUTBOX_BATCH_REGISTRATIONS: bool = True
+    # After a notify(), wait this long so events from concurrent requests land in the same batch.
+    OUTBOX_BATCH_WINDOW: float = 0.2
+
+
+def add_event(db: AsyncSession, event_type: str, payload: dict) -> OutboxEvent:
+    """Stages an event in the caller's transaction; it is published only if that transaction commits"""
+    event = OutboxEvent(event_type=event_type, payload=payload)
+    db.add(event)
+    return event
+
+
+def publish(event_type: str, payload: dict) -> None:
+    if event_type == USER_REGISTERED:
+        post_registration.delay(payload["user_id"])
+    elif event_type == USERS_REGISTERED:
+        post_registration_batch.delay(payload["user_ids"])
+    else:
+        raise ValueError(f"Unknown outbox event type {event_type!r}")
+
+
+def group_events(events: list[OutboxEvent], batch_registrations: bool) -> list[tuple[list[OutboxEvent], str, dict]]:
+    """Returns (events, event_type, payload) groups, merging registration events into one batch if requested"""
+    if not batch_registrations:
+        return [([event], event.event_type, event.payload) for event in events]
+    groups = []
+    registrations = []
+    user_ids = []
+    for event in events:
+        if event.event_type == USER_REGISTERED:
+            registrations.append(event)
+            user_ids.append(event.payload["user_id"])
+        elif event.event_type == USERS_REGISTERED:
+            registrations.append(event)
+            user_ids.extend(event.payload["user_ids"])
+        else:
+            groups.append(([event], event.event_type, event.payload))
+    if registrations:
+        groups.append((registrations, USERS_REGISTERED, {"user_ids": user_ids}))
+    return groups
+
+
+class OutboxRelay:
+    """
+    Drains the outbox table to the broker in batches, outside of the request path
+
+    Rows are locked with SKIP LOCKED so several workers can run a relay side by side, and are
+    deleted only after a successful publish (at-least-once delivery). Failed publishes are
+    retried with exponential backoff until max_attempts is reached.
+
+    Args:
+        session_factory: Factory of sessions used to read and delete events.
+        batch_size: Maximum number of events published per transaction.
+        poll_interval: Seconds between polls when the outbox is empty and no notify() arrives.
+        max_attempts: Publish attempts after which an event is left in the table for inspection.
+        retry_backoff: Base delay, in seconds, before a failed event is retried.
+        batch_registrations: Publish the registration events of a batch as a single task.
+        batch_window: Seconds to wait after a notify() before draining, to grow the batch.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        max_attempts: int = 10,
+        retry_backoff: float = 2.0,
+        batch_registrations: bool = True,
+        batch_window: float = 0.0,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.batch_registrations = batch_registrations
+        self.batch_window = batch_window
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # Broker publishes are blocking; a single thread keeps them off the event loop and reuses one connection.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def drain_once(self) -> int:
+        loop = asyncio.get_running_loop()
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(OutboxEvent)
+                .where(
+                    OutboxEvent.available_at <= datetime.now(UTC),
+                    OutboxEvent.attempts < self.max_attempts,
+                )
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = result.scalars().all()
+            published = []
+            for group, event_type, payload in group_events(events, self.batch_registrations):
+                try:
+                    await loop.run_in_executor(self._executor, publish, event_type, payload)
+                except Exception as e:
+                    logger.warning("Failed to publish %d outbox events", len(group), exc_info=True)
+                    for event in group:
+                        event.attempts += 1
+                        event.last_error = repr(e)
+                        event.available_at = datetime.now(UTC) + timedelta(seconds=self.retry_backoff**event.attempts)
+                else:
+                    published.extend(event.id for event in group)
+            if published:
+                await session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(published)))
+            await session.commit()
+        return len(events)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                drained = await self.drain_once()
+            except Exception:
+                logger.exception("Outbox relay iteration failed")
+                drained = 0
+            if drained < self.batch_size:
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    await asyncio.sleep(self.batch_window)
+                self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+config = OutboxSettings()
+outbox_relay = OutboxRelay(
+    db_session,
+    batch_size=config.OUTBOX_BATCH_SIZE,
+    poll_interval=config.OUTBOX_POLL_INTERVAL,
+    max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+    retry_backoff=config.OUTBOX_RETRY_BACKOFF,
+    batch_registrations=config.OUTBOX_BATCH_REGISTRATIONS,
+    batch_window=config.OUTBOX_BATCH_WINDOW,
+)
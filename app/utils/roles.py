@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+import logging
+from dataclasses import dataclass
+
+from pydantic_settings import BaseSettings
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app.models.roles import Role, RolePrivilege
+
+logger = logging.getLogger(__name__)
+
+
+class RoleSettings(BaseSettings):
+    # Each worker holds its own registry; reloading it this often bounds how long a worker
+    # that did not serve POST /roles/refresh keeps outdated roles.
+    ROLES_RELOAD_INTERVAL: float = 60
+
+
+@dataclass(frozen=True)
+class RoleEntry:
+    id: int
+    name: str
+    description: str | None
+    mask: int
+
+
+def role_mask(role_id: int) -> int:
+    return 1 << role_id
+
+
+def permission_mask(roles: list[int]) -> int:
+    mask = 0
+    for role_id in roles:
+        mask |= role_mask(role_id)
+    return mask
+
+
+class RoleRegistry:
+    """
+    In-memory copy of the roles table with a precomputed permission bit per role
+
+    It starts from the RolePrivilege constants so authorization works before the first load,
+    and is replaced as a whole by load() at startup, on refresh, and periodically once
+    start_reloading() is called.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._roles: dict[int, RoleEntry] = {
+            role_id: RoleEntry(id=role_id, name=name.title(), description=None, mask=role_mask(role_id))
+            for name, role_id in vars(RolePrivilege).items()
+            if not name.startswith("_") and role_id != RolePrivilege.ANY
+        }
+
+    def mask(self, role_id: int) -> int:
+        role = self._roles.get(role_id)
+        return role.mask if role is not None else 0
+
+    def get(self, role_id: int) -> RoleEntry | None:
+        return self._roles.get(role_id)
+
+    def all(self) -> list[RoleEntry]:
+        return list(self._roles.values())
+
+    async def load(self, db: AsyncSession) -> None:
+        result = await db.execute(select(Role.id, Role.name, Role.description).order_by(Role.id))
+        self._roles = {
+            row.id: RoleEntry(id=row.id, name=row.name, description=row.description, mask=role_mask(row.id))
+            for row in result.all()
+        }
+
+    async def reload_periodically(self, session_factory: sessionmaker, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_factory() as session:
+                    await self.load(session)
+            except Exception:
+                logger.exception("Reloading roles failed")
+
+    def start_reloading(self, session_factory: sessionmaker, interval: float) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.reload_periodically(session_factory, interval))
+
+    async def stop_reloading(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+config = RoleSettings()
+role_registry = RoleRegistry()
@@ -0,0 +1,110 @@
+import bisect
+import logging
+import time
+
+from sqlalchemy import Row, case, func, or_, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models.users import User
+from app.utils.users import USER_RESPONSE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MIN_QUERY_LENGTH = 3
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+# How long the in-process prefix index is reused before it is rebuilt from the table.
+PREFIX_INDEX_TTL = 5.0
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class PrefixIndex:
+    """
+    Sorted lowercase usernames and emails, searched by prefix with bisect
+
+    Used instead of the pg_trgm indexes on databases without the extension (SQLite, or a bare
+    local Postgres), where a table this size can be indexed in memory.
+    """
+
+    def __init__(self, entries: list[tuple[int, str, str]]):
+        self.keys: list[tuple[str, int]] = sorted(
+            (key.lower(), user_id) for user_id, username, email in entries for key in (username, email)
+        )
+        self.built_at = time.monotonic()
+
+    def search(self, query: str, limit: int) -> list[int]:
+        query = query.lower()
+        start = bisect.bisect_left(self.keys, (query, -1))
+        best: dict[int, tuple[int, int]] = {}
+        for key, user_id in self.keys[start:]:
+            if not key.startswith(query):
+                break
+            # Exact matches first, then the shortest keys, i.e. the closest completions.
+            rank = (key != query, len(key))
+            best[user_id] = min(best.get(user_id, rank), rank)
+        return sorted(best, key=lambda user_id: (best[user_id], user_id))[:limit]
+
+
+class UserSearch:
+    """
+    Searches users by partial username or email, ranked by relevance
+
+    On Postgres with pg_trgm, a substring match served by the trigram GIN indexes of migration
+    0009, with prefix matches first, then by trigram similarity. Elsewhere, a prefix match on an
+    in-process PrefixIndex rebuilt every PREFIX_INDEX_TTL seconds.
+    """
+
+    def __init__(self):
+        self._trigram: bool | None = None
+        self._prefix_index: PrefixIndex | None = None
+
+    async def has_trigram(self, db: AsyncSession) -> bool:
+        if self._trigram is None:
+            self._trigram = False
+            if db.bind.dialect.name == "postgresql":
+                result = await db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))
+                self._trigram = result.scalar() is not None
+            if not self._trigram:
+                logger.warning("pg_trgm is not available, searching users with an in-process prefix index")
+        return self._trigram
+
+    async def search(self, db: AsyncSession, query: str, limit: int = SEARCH_DEFAULT_LIMIT) -> list[Row]:
+        if await self.has_trigram(db):
+            return await self._search_trigram(db, query, limit)
+        return await self._search_prefix(db, query, limit)
+
+    async def _search_trigram(self, db: AsyncSession, query: str, limit: int) -> list[Row]:
+        pattern = escape_like(query)
+        is_prefix = or_(User.username.ilike(f"{pattern}%", escape="\\"), User.email.ilike(f"{pattern}%", escape="\\"))
+        score = func.greatest(func.similarity(User.username, query), func.similarity(User.email, query))
+        stmt = (
+            select(*USER_RESPONSE_COLUMNS)
+            .where(or_(User.username.ilike(f"%{pattern}%", escape="\\"), User.email.ilike(f"%{pattern}%", escape="\\")))
+            .order_by(case((is_prefix, 0), else_=1), score.desc(), User.id)
+            .limit(limit)
+        )
+        result = await db.execute(stmt)
+        return result.all()
+
+    async def _search_prefix(self, db: AsyncSession, query: str, limit: int) -> list[Row]:
+        if self._prefix_index is None or time.monotonic() - self._prefix_index.built_at > PREFIX_INDEX_TTL:
+            result = await db.execute(select(User.id, User.username, User.email))
+            self._prefix_index = PrefixIndex(result.all())
+        user_ids = self._prefix_index.search(query, limit)
+        if not user_ids:
+            return []
+        # Fetch the rows rather than keeping them in the index, so status and role are never stale.
+        result = await db.execute(select(*USER_RESPONSE_COLUMNS).where(User.id.in_(user_ids)))
+        rows = {row.id: row for row in result.all()}
+        return [rows[user_id] for user_id in user_ids if user_id in rows]
+
+    def clear(self) -> None:
+        self._trigram = None
+        self._prefix_index = None
+
+
+user_search = UserSearch()
@@ -0,0 +1,108 @@
+from collections import Counter
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app.models.stats import UserStats
+from app.models.users import User
+from app.schemas.users import RoleStats, UserStatsResponse
+
+STATS_RECONCILE_CHUNK_SIZE = 10_000
+
+
+class StatsDelta:
+    """Changes to the per-role user counters, accumulated before they are written"""
+
+    def __init__(self):
+        self.total: Counter[int] = Counter()
+        self.active: Counter[int] = Counter()
+
+    def add(self, role_id: int, total: int = 0, active: int = 0) -> None:
+        self.total[role_id] += total
+        self.active[role_id] += active
+
+    def rows(self) -> list[dict]:
+        # Sorted so concurrent writers lock the counter rows in the same order.
+        role_ids = sorted(set(self.total) | set(self.active))
+        return [
+            {"role_id": role_id, "total": self.total[role_id], "active": self.active[role_id]}
+            for role_id in role_ids
+            if self.total[role_id] or self.active[role_id]
+        ]
+
+    def __bool__(self) -> bool:
+        return bool(self.rows())
+
+
+async def apply_stats_delta(db: AsyncSession, delta: StatsDelta) -> None:
+    """Adds `delta` to the counters in the caller's transaction, creating missing role rows"""
+    rows = delta.rows()
+    if not rows:
+        return
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(UserStats).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserStats.role_id],
+        set_={"total": UserStats.total + stmt.excluded.total, "active": UserStats.active + stmt.excluded.active},
+    )
+    await db.execute(stmt)
+
+
+async def get_user_stats(db: AsyncSession) -> UserStatsResponse:
+    result = await db.execute(select(UserStats.role_id, UserStats.total, UserStats.active).order_by(UserStats.role_id))
+    roles = [RoleStats(role_id=row.role_id, total=row.total, active=row.active) for row in result.all()]
+    total = sum(role.total for role in roles)
+    active = sum(role.active for role in roles)
+    return UserStatsResponse(total=total, active=active, inactive=total - active, roles=roles)
+
+
+async def count_users(db: AsyncSession, chunk_size: int = STATS_RECONCILE_CHUNK_SIZE) -> StatsDelta:
+    # Counts one id range at a time so no single query scans the whole table.
+    counts = StatsDelta()
+    last_id = 0
+    while True:
+        upper = await db.scalar(
+            select(User.id).where(User.id > last_id).order_by(User.id).offset(chunk_size - 1).limit(1)
+        )
+        condition = User.id > last_id if upper is None else User.id.between(last_id + 1, upper)
+        result = await db.execute(
+            select(User.role_id, func.count(), func.count().filter(User.is_active.is_(True)))
+            .where(condition)
+            .group_by(User.role_id)
+        )
+        for role_id, total, active in result.all():
+            counts.add(role_id, total, active)
+        if upper is None:
+            return counts
+        last_id = upper
+
+
+async def reconcile_stats(session_factory: sessionmaker, chunk_size: int = STATS_RECONCILE_CHUNK_SIZE) -> StatsDelta:
+    """
+    Recounts users and corrects the counters by the drift found
+
+    Counters and users are read in one snapshot, and the difference is then added to the
+    counters rather than overwriting them, so changes committed during the recount are kept.
+    """
+    drift = StatsDelta()
+    async with session_factory() as session:
+        if session.bind.dialect.name == "postgresql":
+            await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        counts = await count_users(session, chunk_size)
+        result = await session.execute(select(UserStats.role_id, UserStats.total, UserStats.active))
+        counters = {row.role_id: row for row in result.all()}
+        for role_id in set(counts.total) | set(counters):
+            counter = counters.get(role_id)
+            drift.add(
+                role_id,
+                counts.total[role_id] - (counter.total if counter else 0),
+                counts.active[role_id] - (counter.active if counter else 0),
+            )
+    if drift:
+        async with session_factory() as session:
+            await apply_stats_delta(session, drift)
+            await session.commit()
+    return drift
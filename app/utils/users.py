@@ -1,76 +1,329 @@
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import logging
 import os
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
 from datetime import UTC, datetime, timedelta
-from typing import Annotated
+from typing import Annotated, Literal
 
 import jwt
+import orjson
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer
+from pydantic_settings import BaseSettings
+from sqlalchemy import ARRAY, Integer, Row, Select, any_, func, literal, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm.exc import StaleDataError
 
-from app.core.database import get_db_session
-from app.core.hashing import get_password_hash
+from app.core.cache import TTLCache
+from app.core.database import db_session
+from app.core.hashing import password_hasher
+from app.core.replicas import get_read_db_session
+from app.core.timing import measure
 from app.models.roles import RolePrivilege
 from app.models.users import User
 from app.schemas.tokens import TokenData
-from app.schemas.users import UserCreate, UserUpdate
-from app.utils.exceptions import ForbiddenException, UnauthorizedException
-from app.worker.tasks.users import post_registration
+from app.schemas.users import (
+    UserBulkCreateResponse,
+    UserBulkCreateResult,
+    UserBulkStatusResponse,
+    UserCreate,
+    UserPrincipal,
+    UserResponse,
+    UserUpdate,
+)
+from app.utils.conditional import make_etag
+from app.utils.exceptions import (
+    BadRedquestException,
+    ConflictException,
+    ForbiddenException,
+    PreconditionFailedException,
+    UnauthorizedException,
+)
+from app.utils.outbox import USER_REGISTERED, USERS_REGISTERED, add_event, outbox_relay
+from app.utils.roles import permission_mask, role_registry
+from app.utils.stats import StatsDelta, apply_stats_delta
 
 SECRET_KEY = os.environ["SECRET_KEY"]
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 API_TOKEN_HEADER = HTTPBearer()
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE_SIZE = 1000
+# Columns serialized by UserResponse, selected instead of full entities when listing users.
+USER_RESPONSE_COLUMNS = (User.id, User.username, User.email, User.is_active, User.role_id)
+USER_RESPONSE_KEYS = tuple(column.key for column in USER_RESPONSE_COLUMNS)
+EXPORT_BATCH_SIZE = 1000
+BULK_CREATE_MAX_SIZE = 1000
+# Each chunk is committed on its own so row locks are held briefly.
+BULK_STATUS_CHUNK_SIZE = 1000
 
 
-def set_user_model(user: UserCreate) -> User:
+class AuthSettings(BaseSettings):
+    # "database" loads the principal on each request (through the principal cache);
+    # "claims" trusts the role and active status signed into the token.
+    AUTH_MODE: Literal["database", "claims"] = "database"
+    PRINCIPAL_CACHE_SIZE: int = 10_000
+    PRINCIPAL_CACHE_TTL: float = 30
+    TOKEN_CACHE_SIZE: int = 10_000
+    # Upper bound on how long another worker may keep accepting a revoked token in claims mode.
+    TOKEN_VERSION_TTL: float = 15
+    TOKEN_VERSION_CACHE_SIZE: int = 100_000
+
+
+config = AuthSettings()
+principal_cache = TTLCache("principal", maxsize=config.PRINCIPAL_CACHE_SIZE, ttl=config.PRINCIPAL_CACHE_TTL)
+# Entries live until the token's own "exp" claim; the cache-wide ttl is only an upper bound.
+token_cache = TTLCache("token", maxsize=config.TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+token_versions = TTLCache("token_version", maxsize=config.TOKEN_VERSION_CACHE_SIZE, ttl=config.TOKEN_VERSION_TTL)
+
+logger = logging.getLogger(__name__)
+
+
+async def set_user_model(user: UserCreate) -> User:
     return User(
         username=user.username,
         email=user.email,
-        password=get_password_hash(user.password),
+        password=await password_hasher.hash(user.password),
         is_active=False,
     )
 
 
 async def create_user(db: AsyncSession, user: UserCreate) -> User:
-    new_user = set_user_model(user)
+    new_user = await set_user_model(user)
     db.add(new_user)
     try:
+        await db.flush()
+        add_event(db, USER_REGISTERED, {"user_id": new_user.id})
+        delta = StatsDelta()
+        delta.add(new_user.role_id, total=1, active=int(bool(new_user.is_active)))
+        await apply_stats_delta(db, delta)
         await db.commit()
-        await db.refresh(new_user)
-        post_registration.delay()
-        return new_user
     except IntegrityError as e:
         await db.rollback()
         raise HTTPException(status_code=400, detail="Invalid email") from e
+    await db.refresh(new_user)
+    outbox_relay.notify()
+    return new_user
+
 
+async def create_users(db: AsyncSession, users: list[UserCreate]) -> UserBulkCreateResponse:
+    """
+    Creates many users with one INSERT, skipping emails that already exist
 
-async def update_user(db: AsyncSession, user_id: int, user: UserUpdate) -> User:
-    password = get_password_hash(user.password)
-    user.username = user.username
-    user.password = password
+    Passwords are hashed in parallel on the hashing pool and a single registration event is
+    written to the outbox for the whole batch.
+    """
+    unique_users = {}
+    for user in users:
+        unique_users.setdefault(user.email.lower(), user)
+    unique_users = list(unique_users.values())
+    passwords = await password_hasher.hash_many([user.password for user in unique_users])
+    values = [
+        {"username": user.username, "email": user.email, "password": password, "is_active": False}
+        for user, password in zip(unique_users, passwords, strict=True)
+    ]
+    stmt = (
+        insert(User)
+        .values(values)
+        # No conflict target, so emails clashing on either email index are skipped.
+        .on_conflict_do_nothing()
+        .returning(*USER_RESPONSE_COLUMNS)
+    )
+    result = await db.execute(stmt)
+    created = {row.email.lower(): row for row in result.all()}
+    if created:
+        add_event(db, USERS_REGISTERED, {"user_ids": [row.id for row in created.values()]})
+        delta = StatsDelta()
+        for row in created.values():
+            delta.add(row.role_id, total=1, active=int(bool(row.is_active)))
+        await apply_stats_delta(db, delta)
+    await db.commit()
+    outbox_relay.notify()
+
+    results = []
+    for user in users:
+        row = created.pop(user.email.lower(), None)
+        if row is None:
+            results.append(UserBulkCreateResult(email=user.email, status="duplicate"))
+        else:
+            results.append(
+                UserBulkCreateResult(email=user.email, status="created", user=UserResponse.model_validate(row))
+            )
+    created_count = sum(result.status == "created" for result in results)
+    return UserBulkCreateResponse(created=created_count, duplicates=len(results) - created_count, results=results)
+
+
+async def update_user(db: AsyncSession, user: User, user_data: UserUpdate, conditional: bool = False) -> User:
+    """
+    Updates a user's username and password
+
+    Args:
+        conditional: The client sent If-Match, so losing a race to another update is a failed
+            precondition (412) rather than a conflict (409).
+    """
+    user.username = user_data.username
+    user.password = await password_hasher.hash(user_data.password)
+    try:
+        await _flush_user_change(db)
+    except ConflictException as e:
+        if not conditional:
+            raise
+        raise PreconditionFailedException(detail="User was modified since it was fetched") from e
     await db.commit()
     await db.refresh(user)
+    principal_cache.invalidate(user.email)
     return user
 
 
+async def rehash_user_password(db: AsyncSession, user: User, password: str) -> None:
+    # Not a versioned ORM flush: concurrent logins may all rehash, and none of them should fail.
+    # Matching the old hash makes the UPDATE a no-op if the password changed in the meantime, and
+    # the version (the ETag) is left alone since the hash is not part of the user's representation.
+    stmt = (
+        update(User)
+        .where(User.id == user.id, User.password == user.password)
+        .values(password=await password_hasher.hash(password))
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+def revoke_user_tokens(user: User | Row) -> None:
+    principal_cache.invalidate(user.email)
+    token_versions.set(user.id, user.token_version)
+
+
+async def _flush_user_change(db: AsyncSession) -> None:
+    # Single-user writes flush the users row before touching user_stats, so they take their locks
+    # in the same order as the bulk status updates; the opposite order deadlocks with them.
+    try:
+        await db.flush()
+    except StaleDataError as e:
+        # The UPDATE is versioned, so it matches no row if another request changed the user since it was loaded.
+        await db.rollback()
+        raise ConflictException(detail="User was modified by another request, please retry") from e
+
+
+async def _set_user_status(db: AsyncSession, user: User, is_active: bool) -> None:
+    was_active = bool(user.is_active)
+    user.is_active = is_active
+    user.token_version = User.token_version + 1
+    # The versioned UPDATE fails if the user changed since it was loaded, so was_active is current
+    # and a concurrent status change moves the counter once.
+    await _flush_user_change(db)
+    if was_active != is_active:
+        delta = StatsDelta()
+        delta.add(user.role_id, active=1 if is_active else -1)
+        await apply_stats_delta(db, delta)
+
+
 async def activate_user(db: AsyncSession, user: User) -> User:
-    user.is_active = True
+    await _set_user_status(db, user, True)
     await db.commit()
     await db.refresh(user)
+    revoke_user_tokens(user)
     return user
 
 
 async def deactivate_user(db: AsyncSession, user: User) -> User:
-    user.is_active = False
+    await _set_user_status(db, user, False)
+    await db.commit()
+    await db.refresh(user)
+    revoke_user_tokens(user)
+    return user
+
+
+async def _update_users_status(db: AsyncSession, is_active: bool, condition) -> list[Row]:
+    # Joining the locked rows as they were gives the previous status, so only real changes are counted.
+    previous = select(User.id, User.is_active.label("was_active")).where(condition).with_for_update().subquery()
+    stmt = (
+        update(User)
+        .where(User.id == previous.c.id)
+        .values(is_active=is_active, token_version=User.token_version + 1, version=User.version + 1)
+        .returning(User.id, User.email, User.token_version, User.role_id, previous.c.was_active)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(stmt)
+    rows = result.all()
+    delta = StatsDelta()
+    for row in rows:
+        if bool(row.was_active) != is_active:
+            delta.add(row.role_id, active=1 if is_active else -1)
+    await apply_stats_delta(db, delta)
     await db.commit()
+    for row in rows:
+        revoke_user_tokens(row)
+    return rows
+
+
+async def set_users_status(
+    db: AsyncSession, is_active: bool, ids: list[int] | None = None, role_id: int | None = None
+) -> UserBulkStatusResponse:
+    """
+    Activates or deactivates many users with set-based UPDATEs, one chunk at a time
+
+    Args:
+        is_active: Status to set.
+        ids: Users to update. Ids that do not exist (or do not match role_id) are reported as missing.
+        role_id: Update every user with this role.
+    """
+    role_condition = User.role_id == role_id if role_id is not None else True
+    updated = 0
+    missing_ids = []
+    if ids is not None:
+        unique_ids = sorted(set(ids))
+        for i in range(0, len(unique_ids), BULK_STATUS_CHUNK_SIZE):
+            chunk = unique_ids[i : i + BULK_STATUS_CHUNK_SIZE]
+            condition = (User.id == any_(literal(chunk, ARRAY(Integer)))) & role_condition
+            rows = await _update_users_status(db, is_active, condition)
+            updated += len(rows)
+            missing_ids.extend(sorted(set(chunk) - {row.id for row in rows}))
+        return UserBulkStatusResponse(updated=updated, missing_ids=missing_ids)
+
+    while True:
+        chunk = (
+            select(User.id)
+            .where(role_condition, User.is_active.is_distinct_from(is_active))
+            .order_by(User.id)
+            .limit(BULK_STATUS_CHUNK_SIZE)
+        )
+        rows = await _update_users_status(db, is_active, User.id.in_(chunk.scalar_subquery()))
+        updated += len(rows)
+        if len(rows) < BULK_STATUS_CHUNK_SIZE:
+            return UserBulkStatusResponse(updated=updated, missing_ids=missing_ids)
+
+
+async def update_user_role(db: AsyncSession, user: User, role_id: int) -> User:
+    delta = StatsDelta()
+    if user.role_id != role_id:
+        delta.add(user.role_id, total=-1, active=-int(bool(user.is_active)))
+        delta.add(role_id, total=1, active=int(bool(user.is_active)))
+    user.role_id = role_id
+    user.token_version = User.token_version + 1
+    try:
+        await _flush_user_change(db)
+        await apply_stats_delta(db, delta)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid role") from e
     await db.refresh(user)
+    revoke_user_tokens(user)
     return user
 
 
 async def get_user_by_email(db: AsyncSession, email: str) -> User:
-    result = await db.execute(select(User).where(User.email == email))
+    # Emails are unique regardless of case; lower(email) is served by ix_users_email_lower.
+    result = await db.execute(select(User).where(func.lower(User.email) == email.lower()))
     return result.scalar_one_or_none()
 
 
@@ -79,50 +332,220 @@ async def get_user_by_id(db: AsyncSession, user_id: int) -> User:
     return result.scalar_one_or_none()
 
 
-async def get_users(db: AsyncSession) -> User:
-    result = await db.execute(select(User))
-    return result.scalars().all()
+async def get_user_version(db: AsyncSession, user_id: int) -> int | None:
+    result = await db.execute(select(User.version).where(User.id == user_id))
+    return result.scalar_one_or_none()
 
 
-async def get_current_user(
-    credentials: Annotated[HTTPBearer, Depends(API_TOKEN_HEADER)],
-    db: Annotated[AsyncSession, Depends(get_db_session)],
-) -> User:
+def user_etag(user_id: int, version: int) -> str:
+    return make_etag(user_id, version)
+
+
+async def get_principal_by_email(db: AsyncSession, email: str) -> UserPrincipal | None:
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+    result = await db.execute(select(User.id, User.email, User.role_id, User.is_active).where(User.email == email))
+    row = result.one_or_none()
+    if row is None:
+        return None
+    principal = UserPrincipal.model_validate(row)
+    principal_cache.set(email, principal)
+    return principal
+
+
+async def get_token_version(db: AsyncSession, user_id: int) -> int | None:
+    version = token_versions.get(user_id)
+    if version is not None:
+        return version
+    result = await db.execute(select(User.token_version).where(User.id == user_id))
+    version = result.scalar_one_or_none()
+    if version is not None:
+        token_versions.set(user_id, version)
+    return version
+
+
+def serialize_user(user: User | Row) -> dict:
+    """
+    Returns the UserResponse fields of a user as a JSON-ready dict
+
+    Values come from the database, which already enforces the UserResponse types, so endpoints
+    can return them without FastAPI validating the response model again.
+    """
+    return {key: getattr(user, key) for key in USER_RESPONSE_KEYS}
+
+
+def serialize_users(rows: list[Row]) -> list[dict]:
+    # Rows start with USER_RESPONSE_COLUMNS, in order; extra trailing columns such as version are dropped.
+    return [dict(zip(USER_RESPONSE_KEYS, row, strict=False)) for row in rows]
+
+
+def encode_cursor(user_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{user_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        prefix, _, user_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().partition(":")
+        if prefix != "id":
+            raise ValueError(cursor)
+        return int(user_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise BadRedquestException(detail="Invalid cursor") from e
+
+
+def filter_users(stmt: Select, is_active: bool | None = None, role_id: int | None = None) -> Select:
+    if is_active is not None:
+        stmt = stmt.where(User.is_active.is_(is_active))
+    if role_id is not None:
+        stmt = stmt.where(User.role_id == role_id)
+    return stmt
+
+
+async def get_users(
+    db: AsyncSession,
+    limit: int = USERS_PAGE_SIZE,
+    after: str | None = None,
+    is_active: bool | None = None,
+    role_id: int | None = None,
+) -> tuple[list[Row], str | None]:
+    """
+    Returns one keyset page of users ordered by id, and the cursor of the next page if any
+
+    Rows hold USER_RESPONSE_COLUMNS followed by the user version, used for the page ETag.
+
+    Args:
+        limit: Maximum number of users returned.
+        after: Cursor returned with the previous page.
+        is_active: Only return active or inactive users.
+        role_id: Only return users with this role.
+    """
+    stmt = filter_users(select(*USER_RESPONSE_COLUMNS, User.version), is_active, role_id)
+    if after is not None:
+        stmt = stmt.where(User.id > decode_cursor(after))
+    result = await db.execute(stmt.order_by(User.id).limit(limit + 1))
+    rows = result.all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1].id)
+    return rows, None
+
+
+def decode_access_token(token: str) -> TokenData:
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    token_data = token_cache.get(key)
+    if token_data is not None:
+        return token_data
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         token_data = TokenData(**payload)
-        print(token_data)
-        if token_data.email is None:
-            raise UnauthorizedException()
-        print(token_data.email)
     except jwt.InvalidTokenError as e:
         raise UnauthorizedException() from e
-    user = await get_user_by_email(db, token_data.email)
-    if user is None:
+    if token_data.email is None:
         raise UnauthorizedException()
-    return user
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Decoded access token", extra={"user_id": token_data.id, "email": token_data.email})
+    token_cache.set(key, token_data, ttl=token_data.exp - time.time())
+    return token_data
+
+
+async def get_principal_from_claims(db: AsyncSession, token_data: TokenData) -> UserPrincipal:
+    if not token_data.is_active or token_data.ver != await get_token_version(db, token_data.id):
+        raise UnauthorizedException()
+    return UserPrincipal(
+        id=token_data.id,
+        email=token_data.email,
+        role_id=token_data.role_id,
+        is_active=token_data.is_active,
+    )
+
+
+async def export_users(
+    export_format: Literal["ndjson", "csv"],
+    is_active: bool | None = None,
+    role_id: int | None = None,
+    session_factory: Callable[[], AsyncSession] = db_session,
+) -> AsyncIterator[str | bytes]:
+    """
+    Streams users as NDJSON lines or CSV rows through a server-side cursor
+
+    The generator owns its session because request-scoped sessions are closed before a
+    streaming body is sent. If the client disconnects, the response task is cancelled and
+    the cursor and connection are released in the finally block.
+
+    Args:
+        export_format: "ndjson" or "csv".
+        is_active: Only export active or inactive users.
+        role_id: Only export users with this role.
+        session_factory: Factory of the session the export runs on, e.g. a read replica's.
+    """
+    stmt = filter_users(select(*USER_RESPONSE_COLUMNS), is_active, role_id).order_by(User.id)
+    async with session_factory() as session:
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        try:
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(USER_RESPONSE_KEYS)
+                async for partition in result.partitions():
+                    writer.writerows(partition)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue()
+            else:
+                async for partition in result.partitions():
+                    yield b"".join(orjson.dumps(row) + b"\n" for row in serialize_users(partition))
+        finally:
+            await result.close()
+
+
+async def close_export(rows: AsyncGenerator) -> None:
+    # A coroutine function on purpose: BackgroundTask would run a bound aclose in a thread without awaiting it.
+    await rows.aclose()
+
+
+async def get_current_user(
+    credentials: Annotated[HTTPBearer, Depends(API_TOKEN_HEADER)],
+    db: Annotated[AsyncSession, Depends(get_read_db_session)],
+) -> UserPrincipal:
+    with measure("auth"):
+        token_data = decode_access_token(credentials.credentials)
+        if config.AUTH_MODE == "claims" and token_data.ver is not None:
+            return await get_principal_from_claims(db, token_data)
+        principal = await get_principal_by_email(db, token_data.email)
+    if principal is None:
+        raise UnauthorizedException()
+    return principal
 
 
 def create_access_token(user: User) -> str:
-    to_encode = {"id": user.id, "email": user.email, "username": user.username}
+    to_encode = {
+        "id": user.id,
+        "email": user.email,
+        "username": user.username,
+        "role_id": user.role_id,
+        "is_active": user.is_active,
+        "ver": user.token_version,
+    }
     expire = datetime.now(UTC) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def require_roles(allowed_roles: list[RolePrivilege]) -> User:
+def require_roles(allowed_roles: list[RolePrivilege]) -> UserPrincipal:
     """
     Enforces role-based access control for API endpoints
 
     Args:
         allowed_roles: One or more RolePrivilege granting access.
     """
+    allow_any = RolePrivilege.ANY in allowed_roles
+    allowed_mask = permission_mask(allowed_roles)
 
-    def role_permission_check(current_user: Annotated[User, Depends(get_current_user)]):
-        if RolePrivilege.ANY in allowed_roles:
+    def role_permission_check(current_user: Annotated[UserPrincipal, Depends(get_current_user)]):
+        if allow_any or role_registry.mask(current_user.role_id) & allowed_mask:
             return current_user
-        if current_user.role_id not in allowed_roles:
-            raise ForbiddenException()
-        return current_user
+        raise ForbiddenException()
 
     return role_permission_check
@@ -0,0 +1,30 @@
+import asyncio
+from collections.abc import Coroutine
+
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from app.core.database import engine
+
+# Tasks are synchronous, so each worker process keeps one event loop for its lifetime. The pooled
+# connections of the shared engine are bound to that loop and reused by every task of the process.
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def run_async(coroutine: Coroutine):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coroutine)
+
+
+@worker_process_init.connect
+def reset_engine(**kwargs):
+    # Connections inherited from the parent process must not be shared with the forked child.
+    engine.sync_engine.dispose(close=False)
+
+
+@worker_process_shutdown.connect
+def dispose_engine(**kwargs):
+    if _loop is not None and not _loop.is_closed():
+        _loop.run_until_complete(engine.dispose())
+        _loop.close()
@@ -1 +1,2 @@
+from .stats import *  # noqa: F403
 from .users import *  # noqa: F403
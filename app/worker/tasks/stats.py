@@ -0,0 +1,15 @@
+import logging
+
+from app.core.database import db_session
+from app.utils.stats import reconcile_stats
+from app.worker.celery import app
+from app.worker.database import run_async
+
+logger = logging.getLogger(__name__)
+
+
+@app.task
+def reconcile_user_stats():
+    drift = run_async(reconcile_stats(db_session))
+    if drift:
+        logger.warning("Corrected user stats drift: %s", drift.rows())
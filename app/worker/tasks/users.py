@@ -1,6 +1,29 @@
+import logging
+
+from sqlalchemy.future import select
+
+from app.core.database import db_session
+from app.models.users import User
 from app.worker.celery import app
+from app.worker.database import run_async
+
+logger = logging.getLogger(__name__)
+
+
+async def get_registered_users(user_ids: list[int]) -> list:
+    async with db_session() as session:
+        result = await session.execute(select(User.id, User.email, User.username).where(User.id.in_(user_ids)))
+        return result.all()
+
+
+@app.task
+def post_registration(user_id: int | None = None):
+    if user_id is not None:
+        post_registration_batch([user_id])
 
 
 @app.task
-def post_registration():
-    print("User created successfully")
+def post_registration_batch(user_ids: list[int]):
+    users = run_async(get_registered_users(user_ids))
+    for user in users:
+        logger.info("User %s created successfully", user.email)
@@ -1,4 +1,33 @@
 #!/bin/bash
+set -e
 
 alembic upgrade head
-uvicorn app.main:app  --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
+
+if [ "${APP_ENV:-development}" = "production" ]; then
+    # Calibrated once here rather than in each worker, so every worker hashes with the same work factor.
+    if [ -z "${HASHING_ROUNDS:-}" ]; then
+        HASHING_ROUNDS="$(python -m app.core.hashing)"
+        export HASHING_ROUNDS
+    fi
+
+    # Every worker writes its metrics here; samples left by a previous run would be aggregated too.
+    export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+    # X-Forwarded-For is trusted from private networks only (where a load balancer sits), so the
+    # per-IP login throttle sees client addresses instead of putting every login in the proxy's bucket.
+    export FORWARDED_ALLOW_IPS="${FORWARDED_ALLOW_IPS:-127.0.0.1,::1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16}"
+
+    # exec so uvicorn receives SIGTERM: it stops accepting connections and waits for in-flight
+    # requests (up to the graceful timeout) before running the lifespan shutdown.
+    exec uvicorn app.main:app --host 0.0.0.0 --port 8000 \
+        --workers "${WEB_CONCURRENCY:-$(nproc)}" \
+        --loop uvloop \
+        --http httptools \
+        --proxy-headers \
+        --forwarded-allow-ips "$FORWARDED_ALLOW_IPS" \
+        --timeout-graceful-shutdown "${GRACEFUL_SHUTDOWN_TIMEOUT:-30}"
+fi
+
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload